@@ -0,0 +1,3 @@
+-- Keyset pagination for /api/videos: WHERE user_id = ? AND (created_at, id) < (?, ?)
+-- ORDER BY created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_videos_user_created_id ON videos(user_id, created_at DESC, id DESC);
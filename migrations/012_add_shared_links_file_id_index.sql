@@ -0,0 +1,3 @@
+-- Short-link lookups by file_id (get_or_create_short_link, bulk IN (...) lookups)
+-- previously had no index; only short_id and video_id were indexed
+CREATE INDEX IF NOT EXISTS idx_shared_links_file_user ON shared_links(file_id, user_id);
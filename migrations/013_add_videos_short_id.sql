@@ -0,0 +1,35 @@
+-- Store each video's short link on the row itself so list pages can build
+-- links without a shared_links lookup
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS short_id VARCHAR(8);
+
+-- Backfill from links already attached to the video row (oldest first)
+UPDATE videos v
+SET short_id = sl.short_id
+FROM (
+    SELECT DISTINCT ON (video_id) video_id, short_id
+    FROM shared_links
+    WHERE video_id IS NOT NULL
+    ORDER BY video_id, created_at, id
+) sl
+WHERE sl.video_id = v.id AND v.short_id IS NULL;
+
+-- Links created before their video row carry only file_id; videos.file_id is
+-- not unique, so give each such link to a single (the oldest) video row
+UPDATE videos v
+SET short_id = sl.short_id
+FROM (
+    SELECT DISTINCT ON (file_id) file_id, short_id
+    FROM shared_links
+    ORDER BY file_id, created_at, id
+) sl,
+(
+    SELECT DISTINCT ON (file_id) id, file_id
+    FROM videos
+    ORDER BY file_id, created_at, id
+) first_video
+WHERE first_video.id = v.id
+  AND sl.file_id = v.file_id
+  AND v.short_id IS NULL
+  AND NOT EXISTS (SELECT 1 FROM videos taken WHERE taken.short_id = sl.short_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_videos_short_id ON videos(short_id) WHERE short_id IS NOT NULL;
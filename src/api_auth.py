@@ -13,6 +13,9 @@ logger = logging.getLogger(__name__)
 API_KEY_NAME = "X-API-Key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
+# verify_api_key runs on every API request; warn about disabled auth only once
+_no_auth_warned = False
+
 
 def get_api_key() -> Optional[str]:
     """Get the configured API key from environment."""
@@ -32,11 +35,14 @@ async def verify_api_key(api_key: str = Security(api_key_header)) -> str:
     Raises:
         HTTPException: If API key is invalid or missing
     """
+    global _no_auth_warned
     configured_key = get_api_key()
     
     # If no API key is configured, allow all requests
     if not configured_key:
-        logger.warning("No API_KEY configured - API authentication is disabled!")
+        if not _no_auth_warned:
+            logger.warning("No API_KEY configured - API authentication is disabled!")
+            _no_auth_warned = True
         return "no-auth"
     
     if not api_key:
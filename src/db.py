@@ -1,6 +1,11 @@
 import os
+import asyncio
+import copy
+from collections import Counter
 from supabase import create_async_client, AsyncClient
 from dotenv import load_dotenv
+from src.link_shortener import forget_short_ids
+from src.ttl_cache import TTLCache
 
 load_dotenv()
 
@@ -11,6 +16,19 @@ FILES_TABLE = "files"
 SUPER_ADMIN_ID = int(os.getenv("SUPER_ADMIN_ID", "41509535"))
 
 client: AsyncClient = None
+_client_lock = asyncio.Lock()
+
+# short_id -> video row; absorbs repeat watch/stream/download lookups. The
+# cache is per process, so other workers only see a changed row once their
+# entry expires; keep the TTL as short as the server's page caches.
+VIDEO_CACHE_TTL = 30
+_video_by_short_id_cache = TTLCache(maxsize=10000, ttl=VIDEO_CACHE_TTL)
+_short_id_fetch_locks: dict[str, asyncio.Lock] = {}
+
+# Views recorded by queue_view() and not yet written; flush_pending_views()
+# turns each short_id's burst into one counter update
+_pending_views: "Counter[str]" = Counter()
+_pending_view_rows: list = []
 
 # ... (existing functions) ...
 
@@ -231,12 +249,16 @@ def _is_super_admin(user_id: int) -> bool:
     return user_id == SUPER_ADMIN_ID
 
 async def get_database() -> AsyncClient:
-    """Returns the Supabase async client instance."""
+    """Returns the Supabase async client instance (created once per process)."""
     global client
-    if client is None:
-        if not SUPABASE_URL or not SUPABASE_KEY:
-            raise ValueError("SUPABASE_URL or SUPABASE_KEY not found in environment variables!")
-        client = await create_async_client(SUPABASE_URL, SUPABASE_KEY)
+    if client is not None:
+        return client
+    async with _client_lock:
+        # Concurrent first callers wait here instead of each building a client
+        if client is None:
+            if not SUPABASE_URL or not SUPABASE_KEY:
+                raise ValueError("SUPABASE_URL or SUPABASE_KEY not found in environment variables!")
+            client = await create_async_client(SUPABASE_URL, SUPABASE_KEY)
     return client
 
 async def close_database():
@@ -269,6 +291,12 @@ async def get_video_by_url(url: str):
     result = await sb.table(VIDEO_TABLE).select("*").eq("url", url).execute()
     return result.data[0] if result.data else None
 
+async def get_videos_by_url(url: str) -> list[dict]:
+    """Retrieves every uploaded (master) video row for an original URL."""
+    sb = await get_database()
+    result = await sb.table(VIDEO_TABLE).select("*").eq("url", url).execute()
+    return _filter_master_videos(result.data or [])
+
 async def get_video_by_file_id(file_id: str):
     """Retrieves video metadata by Telegram File ID."""
     sb = await get_database()
@@ -276,7 +304,15 @@ async def get_video_by_file_id(file_id: str):
     return result.data[0] if result.data else None
 
 
-async def get_user_videos(user_id: int, filter: str = "all", search: str = "", limit: int = 20, offset: int = 0):
+async def get_user_videos(
+    user_id: int,
+    filter: str = "all",
+    search: str = "",
+    limit: int = 20,
+    offset: int = 0,
+    after: tuple = None,
+    with_next_keyset: bool = False
+):
     """
     Get videos for a specific user with filtering and search.
     
@@ -286,9 +322,13 @@ async def get_user_videos(user_id: int, filter: str = "all", search: str = "", l
         search: Search keyword for title
         limit: Number of videos to return
         offset: Offset for pagination
+        after: (created_at, id) of the last video already seen; when given,
+            pages by keyset instead of offset (ignored for favorites)
+        with_next_keyset: also return the (created_at, id) to pass as `after`
+            for the next page, or None when this was the last page
         
     Returns:
-        List of video metadata
+        List of video metadata, or (videos, next_keyset) with with_next_keyset
     """
     sb = await get_database()
     
@@ -303,8 +343,11 @@ async def get_user_videos(user_id: int, filter: str = "all", search: str = "", l
             if search:
                 videos = [v for v in videos if search.lower() in v.get('title', '').lower()]
 
-            return _filter_master_videos(videos)
-        return []
+            videos = _filter_master_videos(videos)
+        else:
+            videos = []
+        # Favorites are ordered by favorite time, so they only page by offset
+        return (videos, None) if with_next_keyset else videos
     
     # Regular video query
     query = sb.table(VIDEO_TABLE).select("*")
@@ -315,14 +358,30 @@ async def get_user_videos(user_id: int, filter: str = "all", search: str = "", l
     if search:
         query = query.ilike("title", f"%{search}%")
     
-    # Apply sorting
-    query = query.order("created_at", desc=True)
+    # Apply sorting (id breaks created_at ties so keyset pages are stable)
+    query = query.order("created_at", desc=True).order("id", desc=True)
     
     # Apply pagination
-    result = await query.range(offset, offset + limit - 1).execute()
+    if after:
+        after_created_at, after_id = after
+        query = query.or_(
+            f'created_at.lt."{after_created_at}",'
+            f'and(created_at.eq."{after_created_at}",id.lt.{int(after_id)})'
+        )
+        result = await query.limit(limit).execute()
+    else:
+        result = await query.range(offset, offset + limit - 1).execute()
     
-    videos = result.data if result.data else []
-    return _filter_master_videos(videos)
+    rows = result.data if result.data else []
+    videos = _filter_master_videos(rows)
+    if not with_next_keyset:
+        return videos
+
+    # Key off the last row fetched, not the last master video: a page holding
+    # only part rows must still advance, and a short page is the last one
+    last = rows[-1] if len(rows) == limit else None
+    next_keyset = (last.get("created_at"), last.get("id")) if last else None
+    return videos, next_keyset
 
 
 async def get_encoded_videos(user_id: int, limit: int = 20, offset: int = 0):
@@ -541,6 +600,8 @@ async def delete_video(video_id: int, user_id: int):
 
         try:
             await sb.table("shared_links").delete().eq("video_id", video_id).execute()
+            forget_short_ids(short_ids)
+            forget_cached_video(video_id, short_ids)
         except Exception:
             pass
 
@@ -594,36 +655,57 @@ async def get_popular_videos(limit: int = 10):
     return _filter_master_videos(videos)
 
 
-async def get_video_count(user_id: int = None, filter: str = "all"):
+async def get_video_count(user_id: int = None, filter: str = "all", search: str = "", estimated: bool = False):
     """
     Get total video count for a user or all users.
     
     Args:
         user_id: Telegram user ID (optional)
         filter: Filter type ('all', 'favorites', 'recent')
+        search: Search keyword for title
+        estimated: Use the planner's row estimate for large tables instead
+            of an exact COUNT(*)
         
     Returns:
         Video count
     """
     sb = await get_database()
+    count_mode = "estimated" if estimated else "exact"
     
     if filter == "favorites" and user_id:
         # Count favorites
-        result = await sb.table("favorites").select("id", count="exact").eq("user_id", user_id).execute()
-        return result.count if hasattr(result, 'count') else 0
+        result = await sb.table("favorites").select("id", count=count_mode, head=True).eq("user_id", user_id).execute()
+        return result.count or 0
     
-    query = sb.table(VIDEO_TABLE).select("id", count="exact")
+    query = sb.table(VIDEO_TABLE).select("id", count=count_mode, head=True)
     
     if user_id and not _is_super_admin(user_id):
         query = query.eq("user_id", user_id)
+    if search:
+        query = query.ilike("title", f"%{search}%")
     
     result = await query.execute()
-    return result.count if hasattr(result, 'count') else 0
+    return result.count or 0
+
+
+def forget_cached_video(video_id: int = None, short_ids: list = None):
+    """Drop cached short_id lookups for a video whose row changed.
+
+    Only this worker's cache is cleared; other workers keep their entry for
+    up to VIDEO_CACHE_TTL seconds.
+    """
+    for short_id in short_ids or []:
+        _video_by_short_id_cache.pop(short_id)
+    if video_id is not None:
+        _video_by_short_id_cache.invalidate_values(lambda video: video.get("id") == video_id)
 
 
 async def get_video_by_short_id(short_id: str):
     """
     Get video info by short_id from shared_links table.
+    Results are cached per worker for VIDEO_CACHE_TTL seconds; concurrent
+    misses share one query.
+    Callers get their own copy, so editing it cannot corrupt the cache.
     
     Args:
         short_id: Short ID from shared link
@@ -631,27 +713,42 @@ async def get_video_by_short_id(short_id: str):
     Returns:
         Video data with views count or None
     """
+    video = _video_by_short_id_cache.get(short_id)
+    if video is not None:
+        return copy.deepcopy(video)
+
+    lock = _short_id_fetch_locks.setdefault(short_id, asyncio.Lock())
+    try:
+        async with lock:
+            video = _video_by_short_id_cache.get(short_id)
+            if video is None:
+                video = await _fetch_video_by_short_id(short_id)
+                if video is not None:
+                    _video_by_short_id_cache.set(short_id, video)
+            return copy.deepcopy(video)
+    finally:
+        if not lock.locked():
+            _short_id_fetch_locks.pop(short_id, None)
+
+
+async def _fetch_video_by_short_id(short_id: str):
     try:
         sb = await get_database()
         
-        # Get shared link data
-        link_result = await sb.table("shared_links").select("*").eq("short_id", short_id).execute()
+        # Get shared link data with the linked video row embedded through the
+        # video_id foreign key, so the common case is a single round trip
+        link_result = await sb.table("shared_links").select(
+            f"file_id, views, created_at, {VIDEO_TABLE}(*)"
+        ).eq("short_id", short_id).limit(1).execute()
         
         if not link_result.data:
             return None
         
         link_data = link_result.data[0]
-        video_id = link_data.get("video_id")
         file_id = link_data.get("file_id")
+        video_data = link_data.get(VIDEO_TABLE)
         
-        # Get video metadata if video_id exists
-        video_data = None
-        if video_id:
-            video_result = await sb.table(VIDEO_TABLE).select("*").eq("id", video_id).execute()
-            if video_result.data:
-                video_data = video_result.data[0]
-        
-        # If no video metadata, try to get by file_id
+        # Links created before video_id was attached: try to get by file_id
         if not video_data and file_id:
             video_result = await sb.table(VIDEO_TABLE).select("*").eq("file_id", file_id).execute()
             if video_result.data:
@@ -691,28 +788,7 @@ async def increment_view_count_by_short_id(short_id: str, ip_address: str = None
     try:
         sb = await get_database()
         
-        # Get current views from shared_links
-        result = await sb.table("shared_links").select("views, video_id").eq("short_id", short_id).execute()
-        
-        if result.data:
-            current_views = result.data[0].get("views", 0) or 0
-            video_id = result.data[0].get("video_id")
-            
-            # Update views in shared_links
-            await sb.table("shared_links").update({
-                "views": current_views + 1
-            }).eq("short_id", short_id).execute()
-            
-            # Also update video table if video_id exists
-            if video_id:
-                video_result = await sb.table(VIDEO_TABLE).select("views").eq("id", video_id).execute()
-                if video_result.data:
-                    video_views = video_result.data[0].get("views", 0) or 0
-                    await sb.table(VIDEO_TABLE).update({
-                        "views": video_views + 1,
-                        "last_viewed": "now()"
-                    }).eq("id", video_id).execute()
-            
+        if await _add_views_by_short_id(sb, short_id, 1):
             # Insert into views table for analytics (if it exists)
             try:
                 await sb.table("views").insert({
@@ -729,6 +805,88 @@ async def increment_view_count_by_short_id(short_id: str, ip_address: str = None
         logging.error(f"Error incrementing view count: {e}")
 
 
+async def _add_views_by_short_id(sb, short_id: str, count: int) -> bool:
+    """Add `count` views to a shared link and its video; False if the link is unknown."""
+    # Get current views from shared_links
+    result = await sb.table("shared_links").select("views, video_id").eq("short_id", short_id).execute()
+    
+    if not result.data:
+        return False
+    
+    current_views = result.data[0].get("views", 0) or 0
+    video_id = result.data[0].get("video_id")
+    
+    # Update views in shared_links
+    await sb.table("shared_links").update({
+        "views": current_views + count
+    }).eq("short_id", short_id).execute()
+    
+    # Also update video table if video_id exists
+    if video_id:
+        video_result = await sb.table(VIDEO_TABLE).select("views").eq("id", video_id).execute()
+        if video_result.data:
+            video_views = video_result.data[0].get("views", 0) or 0
+            await sb.table(VIDEO_TABLE).update({
+                "views": video_views + count,
+                "last_viewed": "now()"
+            }).eq("id", video_id).execute()
+    return True
+
+
+def queue_view(short_id: str, ip_address: str = None, user_agent: str = None):
+    """
+    Record a view in memory; flush_pending_views() writes it later.
+    
+    Args:
+        short_id: Short ID from shared link
+        ip_address: Optional IP address of viewer
+        user_agent: Optional user agent string
+    """
+    _pending_views[short_id] += 1
+    _pending_view_rows.append({
+        "short_id": short_id,
+        "user_id": None,  # Web viewer, not Telegram user
+        "ip_address": ip_address,
+        "user_agent": user_agent
+    })
+
+
+async def flush_pending_views():
+    """
+    Write views queued by queue_view(): one counter update per short_id and
+    a single batched insert into the views table.
+    """
+    global _pending_views, _pending_view_rows
+    if not _pending_views:
+        return
+    
+    # Swap the buffers before awaiting so views arriving mid-flush are kept
+    counts, rows = _pending_views, _pending_view_rows
+    _pending_views, _pending_view_rows = Counter(), []
+    
+    import logging
+    try:
+        sb = await get_database()
+    except Exception as e:
+        logging.error(f"Error flushing {sum(counts.values())} views: {e}")
+        return
+    
+    known = set()
+    for short_id, count in counts.items():
+        try:
+            if await _add_views_by_short_id(sb, short_id, count):
+                known.add(short_id)
+        except Exception as e:
+            logging.error(f"Error incrementing view count for {short_id}: {e}")
+    
+    rows = [row for row in rows if row["short_id"] in known]
+    if rows:
+        try:
+            await sb.table("views").insert(rows).execute()
+        except Exception:
+            pass  # views table might not exist yet
+
+
 async def delete_video_by_id(video_id: int, user_id: int):
     """
     Delete a video by ID (only if it belongs to the user).
@@ -829,6 +987,7 @@ async def update_video_metadata(
         update_data['tags'] = tags
 
     result = await sb.table(VIDEO_TABLE).update(update_data).eq("id", video_id).eq("user_id", user_id).execute()
+    forget_cached_video(video_id)
 
     return len(result.data) > 0
 
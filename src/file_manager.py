@@ -3,36 +3,78 @@ import os
 import logging
 import tempfile
 import shutil
+import sys
 import zipfile
 import httpx
+import aiofiles
 from datetime import datetime
 from pathlib import Path
 from telegram import Bot
 from telegram.request import HTTPXRequest
 from telegram.constants import ParseMode
+from src.ttl_cache import TTLCache
+from src.work_dir import get_work_dir
 
 logger = logging.getLogger(__name__)
 
 DOWNLOAD_CACHE_DIR = Path("download_cache")
 DOWNLOAD_CACHE_DIR.mkdir(exist_ok=True)
 
-async def get_telegram_file_url(bot_token, file_id):
+PART_DOWNLOAD_CONCURRENCY = 4  # Parallel part downloads per task
+CHUNK_SIZE = 4 * 1024 * 1024  # 4MB; fewer writes per downloaded part
+SENDFILE_CHUNK_SIZE = 16 * 1024 * 1024  # Kernel-side copies when assembling parts
+FILE_URL_TTL = 3000  # Telegram download links stay valid for at least an hour
+
+# file_id -> download URL, so repeat tasks for the same file skip getFile
+_file_url_cache = TTLCache(maxsize=1024, ttl=FILE_URL_TTL)
+
+def assemble_parts(part_paths, dest_path):
+    """Join downloaded parts into dest_path, deleting each part once copied.
+
+    On Linux the bytes are moved with sendfile, so they never pass through
+    userspace; elsewhere a buffered copy is used. Blocking: run it in a thread.
+    """
+    with open(dest_path, 'wb') as outfile:
+        for part in part_paths:
+            with open(part, 'rb') as infile:
+                if sys.platform.startswith("linux"):
+                    offset = 0
+                    while sent := os.sendfile(outfile.fileno(), infile.fileno(), offset, SENDFILE_CHUNK_SIZE):
+                        offset += sent
+                else:
+                    shutil.copyfileobj(infile, outfile, CHUNK_SIZE)
+            os.remove(part)
+
+async def get_telegram_file_url(bot_token, file_id, client=None):
+    """Get the download URL for a Telegram file ID.
+
+    Pass the task's download client to reuse its connections to api.telegram.org.
+    """
+    cached = _file_url_cache.get(file_id)
+    if cached is not None:
+        return cached
+
     url = f"https://api.telegram.org/bot{bot_token}/getFile?file_id={file_id}"
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url)
-        data = resp.json()
-        if not data.get("ok"):
-            raise Exception(f"Telegram getFile failed: {data}")
-        file_path = data["result"]["file_path"]
-        return f"https://api.telegram.org/file/bot{bot_token}/{file_path}"
+    if client is None:
+        async with httpx.AsyncClient() as own_client:
+            return await get_telegram_file_url(bot_token, file_id, own_client)
+    resp = await client.get(url)
+    data = resp.json()
+    if not data.get("ok"):
+        raise Exception(f"Telegram getFile failed: {data}")
+    file_path = data["result"]["file_path"]
+    file_url = f"https://api.telegram.org/file/bot{bot_token}/{file_path}"
+    _file_url_cache.set(file_id, file_url)
+    return file_url
 
 async def download_file(client, url, dest_path):
+    """Download a single file from a URL."""
     try:
         async with client.stream("GET", url) as r:
             r.raise_for_status()
-            with open(dest_path, "wb") as f:
-                async for chunk in r.aiter_bytes(chunk_size=65536):
-                    f.write(chunk)
+            async with aiofiles.open(dest_path, "wb") as f:
+                async for chunk in r.aiter_bytes(chunk_size=CHUNK_SIZE):
+                    await f.write(chunk)
         return True
     except Exception as e:
         logger.error(f"Download failed for {url}: {e}")
@@ -53,7 +95,7 @@ async def prepare_download_task(
     bot_token: str,
     base_url: str
 ):
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = tempfile.mkdtemp(dir=get_work_dir())
     is_zip = len(files_info) > 1
     
     # Determine final filename
@@ -79,34 +121,45 @@ async def prepare_download_task(
                 file_name = item['name']
                 parts = item['parts']
                 
-                # Download all parts
-                part_paths = []
-                for i, fid in enumerate(parts):
-                    url = await get_telegram_file_url(bot_token, fid)
-                    part_name = f"{file_name}.part{i}"
-                    dest = os.path.join(temp_dir, part_name)
-                    if await download_file(client, url, dest):
-                        part_paths.append(dest)
-                    else:
-                        raise Exception(f"Failed to download part of {file_name}")
+                # Download all parts, a few at a time; paths keep assembly order
+                part_paths = [
+                    os.path.join(temp_dir, f"{file_name}.part{i}") for i in range(len(parts))
+                ]
+                semaphore = asyncio.Semaphore(PART_DOWNLOAD_CONCURRENCY)
+
+                async def fetch_part(fid, dest):
+                    async with semaphore:
+                        url = await get_telegram_file_url(bot_token, fid, client)
+                        if not await download_file(client, url, dest):
+                            raise Exception(f"Failed to download part of {file_name}")
+
+                tasks = [
+                    asyncio.create_task(fetch_part(fid, dest))
+                    for fid, dest in zip(parts, part_paths)
+                ]
+                try:
+                    await asyncio.gather(*tasks)
+                except BaseException:
+                    for task in tasks:
+                        task.cancel()
+                    raise
                 
-                # Assemble parts
+                # Assemble parts off the event loop
                 assembled_path = os.path.join(temp_dir, file_name)
-                with open(assembled_path, 'wb') as outfile:
-                    for part in part_paths:
-                        with open(part, 'rb') as infile:
-                            shutil.copyfileobj(infile, outfile)
-                        os.remove(part) # Clean up part
+                await asyncio.to_thread(assemble_parts, part_paths, assembled_path)
                 
                 prepared_files.append(assembled_path)
 
-        # Final Package
+        # Final Package (compression and cross-device moves block, so use a thread)
         if is_zip:
-            with zipfile.ZipFile(final_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for f in prepared_files:
-                    zipf.write(f, arcname=os.path.basename(f))
+            def write_zip():
+                with zipfile.ZipFile(final_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                    for f in prepared_files:
+                        zipf.write(f, arcname=os.path.basename(f))
+
+            await asyncio.to_thread(write_zip)
         else:
-            shutil.move(prepared_files[0], final_path)
+            await asyncio.to_thread(shutil.move, prepared_files[0], final_path)
 
         # Notify
         download_link = f"{base_url}/api/files/download_ready/{task_id}/{final_name}"
@@ -121,7 +174,7 @@ async def prepare_download_task(
         await notify_user(bot_token, user_id, f"❌ <b>실패</b>\n작업 중 오류가 발생했습니다: {e}")
     finally:
         if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            await asyncio.to_thread(shutil.rmtree, temp_dir, ignore_errors=True)
 
 async def cleanup_old_downloads():
     """Delete files in download cache older than 7 days."""
@@ -1,13 +1,41 @@
 """
 Link shortener module for generating short unique IDs for video sharing.
 """
+import asyncio
 import string
 import random
 import logging
+from collections import OrderedDict
 from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# In-process LRU of file_id -> short_id. Short links are never rewritten, so
+# entries only leave on eviction or when the owning video is deleted.
+SHORT_ID_CACHE_SIZE = 4096
+_short_id_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _get_cached_short_id(file_id: str) -> Optional[str]:
+    short_id = _short_id_cache.get(file_id)
+    if short_id is not None:
+        _short_id_cache.move_to_end(file_id)
+    return short_id
+
+
+def _remember_short_id(file_id: str, short_id: str) -> None:
+    _short_id_cache[file_id] = short_id
+    _short_id_cache.move_to_end(file_id)
+    if len(_short_id_cache) > SHORT_ID_CACHE_SIZE:
+        _short_id_cache.popitem(last=False)
+
+
+def forget_short_ids(short_ids) -> None:
+    """Drop cached mappings for short links that were deleted."""
+    short_ids = set(short_ids)
+    for file_id in [f for f, s in _short_id_cache.items() if s in short_ids]:
+        del _short_id_cache[file_id]
+
 
 def generate_short_id(length: int = 8) -> str:
     """
@@ -23,6 +51,29 @@ def generate_short_id(length: int = 8) -> str:
     return ''.join(random.choice(chars) for _ in range(length))
 
 
+def _is_unique_violation(error: Exception) -> bool:
+    """True for Postgres unique_violation (23505), i.e. a short_id collision."""
+    if getattr(error, "code", None) == "23505":
+        return True
+    return "duplicate key" in str(error).lower()
+
+
+async def _reroll_taken_short_ids(db_client, rows: list) -> None:
+    """Replace short_ids in rows that already exist, probing all of them in one query."""
+    result = await db_client.table("shared_links").select("short_id").in_(
+        "short_id", [row["short_id"] for row in rows]
+    ).execute()
+    taken = {row["short_id"] for row in (result.data or [])}
+    used = {row["short_id"] for row in rows}
+    for row in rows:
+        if row["short_id"] in taken:
+            short_id = generate_short_id()
+            while short_id in used or short_id in taken:
+                short_id = generate_short_id()
+            used.add(short_id)
+            row["short_id"] = short_id
+
+
 async def create_short_link(db_client, file_id: str, video_id: Optional[int], user_id: int) -> str:
     """
     Create a short link for a file_id and store it in the database.
@@ -52,11 +103,12 @@ async def create_short_link(db_client, file_id: str, video_id: Optional[int], us
             }).execute()
             
             logger.info(f"Created short link: {short_id} -> {file_id}")
+            _remember_short_id(file_id, short_id)
             return short_id
             
         except Exception as e:
-            # If collision (unlikely), try again
-            if "duplicate" in str(e).lower() or "unique" in str(e).lower():
+            # Only a short_id collision (unlikely) is worth a re-roll
+            if _is_unique_violation(e):
                 logger.warning(f"Short ID collision on attempt {attempt + 1}, retrying...")
                 continue
             else:
@@ -67,6 +119,46 @@ async def create_short_link(db_client, file_id: str, video_id: Optional[int], us
     raise Exception("Failed to generate unique short ID after maximum attempts")
 
 
+async def attach_video_to_short_link(db_client, short_id: str, video_id: int) -> None:
+    """
+    Link a short link and a video row created independently of each other.
+
+    Backfills video_id on the short link and short_id on the video row, so
+    list pages can read the link straight off the video.
+    
+    Args:
+        db_client: Supabase async client
+        short_id: The short ID to update
+        video_id: Video ID in database
+    """
+    try:
+        await asyncio.gather(
+            db_client.table("shared_links").update({
+                "video_id": video_id
+            }).eq("short_id", short_id).execute(),
+            db_client.table("videos").update({
+                "short_id": short_id
+            }).eq("id", video_id).execute()
+        )
+    except Exception as e:
+        logger.error(f"Error attaching video {video_id} to short link {short_id}: {e}")
+
+
+async def delete_short_link(db_client, short_id: str) -> None:
+    """
+    Remove a short link whose video row could not be saved.
+    
+    Args:
+        db_client: Supabase async client
+        short_id: The short ID to delete
+    """
+    try:
+        await db_client.table("shared_links").delete().eq("short_id", short_id).execute()
+    except Exception as e:
+        logger.error(f"Error deleting short link {short_id}: {e}")
+    forget_short_ids([short_id])
+
+
 async def resolve_short_link(db_client, short_id: str) -> Optional[dict]:
     """
     Resolve a short_id to its file_id and metadata.
@@ -110,11 +202,16 @@ async def get_or_create_short_link(db_client, file_id: str, video_id: Optional[i
     Returns:
         The short_id (existing or newly created)
     """
+    cached = _get_cached_short_id(file_id)
+    if cached:
+        return cached
+
     try:
         # Check if short link already exists for this file_id
         result = await db_client.table("shared_links").select("short_id").eq("file_id", file_id).execute()
         
         if result.data:
+            _remember_short_id(file_id, result.data[0]["short_id"])
             return result.data[0]["short_id"]
         
         # Create new short link
@@ -124,3 +221,80 @@ async def get_or_create_short_link(db_client, file_id: str, video_id: Optional[i
         logger.error(f"Error in get_or_create_short_link: {e}")
         # Return file_id as fallback
         return file_id
+
+
+async def bulk_get_or_create_short_links(db_client, videos: list, user_id: int) -> dict:
+    """
+    Get or create short links for many videos with one lookup and one insert.
+    
+    Args:
+        db_client: Supabase async client
+        videos: Video rows with 'file_id' and (optionally) 'id'
+        user_id: Telegram user ID
+        
+    Returns:
+        Dictionary mapping file_id to short_id (file_id itself on failure)
+    """
+    short_ids = {}
+    video_ids = {}
+    for video in videos:
+        file_id = video.get("file_id")
+        if not file_id or file_id in short_ids or file_id in video_ids:
+            continue
+        cached = _get_cached_short_id(file_id)
+        if cached:
+            short_ids[file_id] = cached
+        else:
+            video_ids[file_id] = video.get("id")
+
+    if not video_ids:
+        return short_ids
+
+    try:
+        result = await db_client.table("shared_links").select("file_id, short_id").in_(
+            "file_id", list(video_ids)
+        ).execute()
+        for row in (result.data or []):
+            short_ids[row["file_id"]] = row["short_id"]
+            _remember_short_id(row["file_id"], row["short_id"])
+
+        new_rows = [
+            {
+                "short_id": generate_short_id(),
+                "file_id": file_id,
+                "video_id": video_id,
+                "user_id": user_id,
+                "views": 0
+            }
+            for file_id, video_id in video_ids.items()
+            if file_id not in short_ids
+        ]
+        if new_rows:
+            try:
+                try:
+                    await db_client.table("shared_links").insert(new_rows).execute()
+                except Exception as e:
+                    if not _is_unique_violation(e):
+                        raise
+                    # A single collision rejects the whole batch: probe every
+                    # candidate at once, re-roll the taken ones and retry once
+                    logger.warning(f"Short ID collision in bulk insert, re-rolling: {e}")
+                    await _reroll_taken_short_ids(db_client, new_rows)
+                    await db_client.table("shared_links").insert(new_rows).execute()
+                for row in new_rows:
+                    short_ids[row["file_id"]] = row["short_id"]
+                    _remember_short_id(row["file_id"], row["short_id"])
+                logger.info(f"Created {len(new_rows)} short links")
+            except Exception as e:
+                logger.warning(f"Bulk short link insert failed, retrying individually: {e}")
+                for row in new_rows:
+                    short_ids[row["file_id"]] = await get_or_create_short_link(
+                        db_client, row["file_id"], row["video_id"], user_id
+                    )
+
+        return short_ids
+
+    except Exception as e:
+        logger.error(f"Error in bulk_get_or_create_short_links: {e}")
+        short_ids.update({file_id: file_id for file_id in video_ids if file_id not in short_ids})
+        return short_ids
@@ -1,31 +1,71 @@
 from fastapi import FastAPI, HTTPException, Request, Header, Body, File, UploadFile, Form, BackgroundTasks
-from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse, JSONResponse, RedirectResponse, Response
+from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse, JSONResponse, ORJSONResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import asyncio
-import mimetypes
 import os
 import httpx
 import logging
 import json
+import orjson
 import subprocess
+import sys
 import tempfile
 import shutil
 from urllib.parse import quote
-from datetime import datetime
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+from functools import lru_cache
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 from typing import Optional, Tuple
 from pathlib import Path
 import hashlib
+import base64
 import time
-import re
+import random
 import traceback
-from telegram import Bot
+from telegram import Bot, InputFile
 from telegram.request import HTTPXRequest
 from telegram.constants import ParseMode
-from src.transcoder import transcode_video_task, cleanup_old_encoded_files
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from src.transcoder import transcode_video_task, cleanup_old_encoded_files, is_transcoding
 from src.file_manager import prepare_download_task, DOWNLOAD_CACHE_DIR, cleanup_old_downloads
+from src.ttl_cache import TTLCache
+from src.work_dir import get_work_dir
+from src.splitter import split_video, iter_split_video, get_video_duration, planned_part_count
+from src.db import (
+    get_database,
+    get_video_by_short_id,
+    get_video_by_file_id,
+    get_video_by_id,
+    get_video_by_url,
+    get_videos_by_url,
+    get_user_videos,
+    get_user_favorites,
+    get_favorite_videos,
+    get_encoded_videos,
+    get_video_count,
+    search_videos,
+    update_video_metadata,
+    delete_video_by_id,
+    is_favorite,
+    add_favorite,
+    remove_favorite,
+    forget_cached_video,
+    queue_view,
+    flush_pending_views,
+)
+from src.link_shortener import (
+    get_or_create_short_link,
+    bulk_get_or_create_short_links,
+    create_short_link,
+    attach_video_to_short_link,
+    delete_short_link,
+)
+from src import user_manager
+from src.api_auth import verify_api_key
 SUBTITLE_CACHE_DIR = Path("download_cache") / "subtitles"
 SUBTITLE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 from src.epub_parser import get_epub_metadata
@@ -38,7 +78,7 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="TVB API", version="1.0.0")
+app = FastAPI(title="TVB API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Include routers
 # Note: user_id dependency will be handled by each route accepting user_id parameter
@@ -82,12 +122,11 @@ async def clear_cache(user_id: int):
                         deleted_files += 1
                         deleted_size += file_size
                     elif item.is_dir():
-                        # Delete directory and contents
-                        folder_size = sum(f.stat().st_size for f in item.rglob('*') if f.is_file())
-                        folder_file_count = sum(1 for f in item.rglob('*') if f.is_file())
+                        # Delete directory and contents; one walk gives count and size
+                        file_sizes = [f.stat().st_size for f in item.rglob('*') if f.is_file()]
                         shutil.rmtree(item)
-                        deleted_files += folder_file_count
-                        deleted_size += folder_size
+                        deleted_files += len(file_sizes)
+                        deleted_size += sum(file_sizes)
                 except Exception as e:
                     logger.error(f"Error deleting {item}: {e}")
 
@@ -143,16 +182,19 @@ async def get_cache_stats():
         # Download cache stats
         download_cache = Path("download_cache")
         if download_cache.exists():
-            files = [f for f in download_cache.rglob('*') if f.is_file() and 'comics' not in str(f)]
-            stats["download_cache"]["files"] = len(files)
-            stats["download_cache"]["size_mb"] = round(sum(f.stat().st_size for f in files) / (1024 * 1024), 2)
+            file_sizes = [
+                f.stat().st_size for f in download_cache.rglob('*')
+                if f.is_file() and 'comics' not in str(f)
+            ]
+            stats["download_cache"]["files"] = len(file_sizes)
+            stats["download_cache"]["size_mb"] = round(sum(file_sizes) / (1024 * 1024), 2)
 
         # Encoded cache stats
         encoded_cache = Path("encoded_cache")
         if encoded_cache.exists():
-            files = [f for f in encoded_cache.rglob('*') if f.is_file()]
-            stats["encoded_cache"]["files"] = len(files)
-            stats["encoded_cache"]["size_mb"] = round(sum(f.stat().st_size for f in files) / (1024 * 1024), 2)
+            file_sizes = [f.stat().st_size for f in encoded_cache.rglob('*') if f.is_file()]
+            stats["encoded_cache"]["files"] = len(file_sizes)
+            stats["encoded_cache"]["size_mb"] = round(sum(file_sizes) / (1024 * 1024), 2)
 
         # Total
         stats["total"]["files"] = stats["download_cache"]["files"] + stats["encoded_cache"]["files"]
@@ -166,27 +208,87 @@ async def get_cache_stats():
 
 
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_GETFILE_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getFile"
+TELEGRAM_FILE_URL_PREFIX = f"https://api.telegram.org/file/bot{TELEGRAM_BOT_TOKEN}/"
+# Resolved once; PATH lookups per request add a stat per directory
+FFMPEG_PATH = shutil.which("ffmpeg")
+FFPROBE_PATH = shutil.which("ffprobe")
 DEFAULT_USER_ID = int(os.getenv("ADMIN_USER_ID", "41509535"))
 SUPER_ADMIN_ID = int(os.getenv("SUPER_ADMIN_ID", "41509535"))
-MAX_WEB_UPLOAD_SIZE = 15 * 1024 * 1024  # 15MB to stay under Telegram getFile limit.
+# 15MB to stay under Telegram getFile limit. This bounds part size, not the
+# 50MB Bot API upload cap: /stream, /download and concat playback fetch parts
+# through getFile, which refuses files over 20MB however they were uploaded.
+MAX_WEB_UPLOAD_SIZE = 15 * 1024 * 1024
+TELEGRAM_UPLOAD_CONCURRENCY = 4  # Parallel part uploads per request
+UPLOAD_READ_CHUNK_SIZE = 4 * 1024 * 1024  # Request body reads when spooling uploads to disk
+UPLOAD_SENDFILE_CHUNK_SIZE = 16 * 1024 * 1024  # Kernel-side copies of rolled-over uploads
+CACHE_FILL_CHUNK_SIZE = 1024 * 1024  # Upstream bytes per write when filling the download cache
+TELEGRAM_BOT_POOL_SIZE = 32  # Connections shared by all concurrent uploads
+
+VIEW_FLUSH_INTERVAL = 5  # Seconds between batched view-count writes
 
 # Global Bot Instance
 global_bot: Optional[Bot] = None
+view_flush_task: Optional[asyncio.Task] = None
+
+
+def get_bot() -> Bot:
+    """Return the process-wide Bot, creating it on first use.
+
+    Every upload path shares it so requests reuse one keep-alive connection
+    pool to api.telegram.org instead of opening a new client per request.
+    """
+    global global_bot
+    if global_bot is None:
+        if not TELEGRAM_BOT_TOKEN:
+            raise Exception("TELEGRAM_BOT_TOKEN not configured")
+        request = HTTPXRequest(
+            connection_pool_size=TELEGRAM_BOT_POOL_SIZE,
+            connect_timeout=60,
+            read_timeout=600,
+            write_timeout=600,
+            pool_timeout=60
+        )
+        global_bot = Bot(token=TELEGRAM_BOT_TOKEN, request=request)
+    return global_bot
+
+# Shared HTTP client for Telegram API/file requests (one connection pool per process)
+http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide httpx client, creating it on first use."""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, read=600.0),
+            limits=httpx.Limits(
+                max_connections=200,
+                max_keepalive_connections=50,
+                keepalive_expiry=60
+            ),
+            follow_redirects=True
+        )
+    return http_client
+
+async def flush_views_periodically():
+    """Write queued view counts every VIEW_FLUSH_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(VIEW_FLUSH_INTERVAL)
+        try:
+            await flush_pending_views()
+        except Exception as e:
+            logger.error(f"View flush failed: {e}")
 
 @app.on_event("startup")
 async def startup_event():
-    global global_bot
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    if token:
+    global global_bot, view_flush_task
+    if TELEGRAM_BOT_TOKEN:
         try:
-            request = HTTPXRequest(
-                connect_timeout=60,
-                read_timeout=600,
-                write_timeout=600,
-                pool_timeout=60
-            )
-            global_bot = Bot(token=token, request=request)
-            me = await global_bot.get_me()
+            bot = get_bot()
+            await bot.initialize()
+            me = bot.bot
             logger.info(f"🤖 Bot initialized: @{me.username} (ID: {me.id})")
             logger.info(f"📢 Notification target (DEFAULT_USER_ID): {DEFAULT_USER_ID}")
         except Exception as e:
@@ -194,13 +296,19 @@ async def startup_event():
             global_bot = None
     else:
         logger.warning("⚠️ TELEGRAM_BOT_TOKEN not found. Bot features will be disabled.")
+
+    # Surface a bad DL_WORKDIR at startup rather than on the first download
+    get_work_dir()
+
+    if not FFMPEG_PATH or not FFPROBE_PATH:
+        logger.warning("⚠️ FFmpeg/ffprobe not found in PATH. Splitting, thumbnails and multi-part playback will fail.")
     
     # Start cleanup tasks
     try:
-        from src.db import get_database
         sb = await get_database()
         asyncio.create_task(cleanup_old_encoded_files(sb))
         asyncio.create_task(cleanup_old_downloads())
+        view_flush_task = asyncio.create_task(flush_views_periodically())
         
         # Start comic series migration (mostly harmless if already done)
         # Disabled auto-run to prevent unnecessary load on every startup
@@ -209,6 +317,18 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Failed to start background tasks: {e}")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if view_flush_task is not None:
+        view_flush_task.cancel()
+    # Persist views recorded since the last periodic flush
+    await flush_pending_views()
+    if http_client is not None:
+        await http_client.aclose()
+    if global_bot is not None:
+        await global_bot.shutdown()
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -234,71 +354,82 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # File info cache for metadata (file_path, file_size, etc.)
 # Format: {file_id: {"url": str, "size": int, "timestamp": float}}
-file_info_cache = {}
+# Kept in LRU order: hits move to the end, evictions pop from the front
+file_info_cache: "OrderedDict[str, dict]" = OrderedDict()
 CACHE_TTL = 3600  # 1 hour cache TTL
 MAX_CACHE_SIZE = 1000  # Maximum number of cached entries
 
+# Short-lived page caches to absorb refresh/back-button bursts
+# dashboard: {user_id: (stats, formatted_videos)}
+# search: {(user_id, q, date_from, date_to, duration, sort): formatted_results}
+# api: {("videos", user_id, page, per_page, filter, search, after) | ("stats", user_id)
+#       | ("favorites", user_id): response body}
+PAGE_CACHE_TTL = 30
+dashboard_cache = TTLCache(maxsize=1024, ttl=PAGE_CACHE_TTL)
+search_cache = TTLCache(maxsize=1024, ttl=PAGE_CACHE_TTL)
+api_cache = TTLCache(maxsize=1024, ttl=PAGE_CACHE_TTL)
+
+
+def invalidate_user_page_cache(user_id: Optional[int]):
+    """Drop cached dashboard/search pages after a user's videos change."""
+    # The super admin sees every user's videos, so their pages go stale too
+    affected = {user_id, SUPER_ADMIN_ID}
+    dashboard_cache.invalidate(lambda key: key in affected)
+    search_cache.invalidate(lambda key: key[0] in affected)
+    api_cache.invalidate(lambda key: key[1] in affected)
+
+
+def invalidate_user_favorites_cache(user_id: int):
+    """Drop cached favorites responses, including /api/videos?filter=favorites."""
+    api_cache.invalidate(
+        lambda key: key[1] == user_id and (
+            key[0] == "favorites" or (key[0] == "videos" and key[4] == "favorites")
+        )
+    )
+
 # Progress tracking for downloads
 # Format: {task_id: {"status": str, "progress": float, "title": str, "error": str}}
 download_progress = {}
+# Set whenever a task's entry in download_progress changes, so SSE streams
+# wake up on updates instead of polling
+progress_events: dict[str, asyncio.Event] = {}
+PROGRESS_KEEPALIVE_SECONDS = 15
+# Finished tasks stay visible this long for late or reconnecting SSE clients
+PROGRESS_RETENTION_SECONDS = 600
 
-# Adaptive chunk size constants
-CHUNK_SIZE_SMALL = 32768    # 32KB - for slow networks, initial buffering
-CHUNK_SIZE_MEDIUM = 65536   # 64KB - default balanced size
-CHUNK_SIZE_LARGE = 131072   # 128KB - for fast networks
-CHUNK_SIZE_XLARGE = 262144  # 256KB - for very fast networks
 
+def signal_download_progress(task_id: str):
+    """Wake SSE streams waiting on `task_id`. Must run on the event loop."""
+    event = progress_events.get(task_id)
+    if event is not None:
+        event.set()
 
-# Utility Functions
-def clean_cache_if_needed():
-    """Remove oldest cache entries if cache size exceeds limit"""
-    if len(file_info_cache) > MAX_CACHE_SIZE:
-        # Sort by timestamp and keep only the most recent MAX_CACHE_SIZE entries
-        sorted_items = sorted(
-            file_info_cache.items(),
-            key=lambda x: x[1].get("timestamp", 0),
-            reverse=True
-        )
-        file_info_cache.clear()
-        file_info_cache.update(dict(sorted_items[:MAX_CACHE_SIZE]))
-        logger.info(f"Cache cleaned: {len(file_info_cache)} entries remaining")
 
+def _forget_download_progress(task_id: str):
+    download_progress.pop(task_id, None)
+    progress_events.pop(task_id, None)
 
-def get_adaptive_chunk_size(connection_speed: Optional[str] = None) -> int:
-    """
-    Determine optimal chunk size based on connection speed hint.
-
-    Args:
-        connection_speed: Client hint for connection quality
-                         ("slow-2g", "2g", "3g", "4g", None)
 
-    Returns:
-        Optimal chunk size in bytes
-    """
-    if not connection_speed:
-        return CHUNK_SIZE_MEDIUM  # Default balanced size
-
-    speed = connection_speed.lower()
-    if speed in ("slow-2g", "2g"):
-        return CHUNK_SIZE_SMALL   # 32KB for slow connections
-    elif speed == "3g":
-        return CHUNK_SIZE_MEDIUM  # 64KB for moderate connections
-    elif speed in ("4g", "5g"):
-        return CHUNK_SIZE_LARGE   # 128KB for fast connections
-    else:
-        return CHUNK_SIZE_MEDIUM  # Default
+def finish_download_progress(task_id: str):
+    """Signal a task's final state and schedule its entries for removal."""
+    signal_download_progress(task_id)
+    asyncio.get_running_loop().call_later(
+        PROGRESS_RETENTION_SECONDS,
+        _forget_download_progress,
+        task_id
+    )
 
 
+# Utility Functions
+@lru_cache(maxsize=4096)
 def format_duration(seconds):
     """Format duration in seconds to HH:MM:SS or MM:SS"""
     if not seconds:
         return "00:00"
 
     try:
-        seconds = int(seconds)
-        hours = seconds // 3600
-        minutes = (seconds % 3600) // 60
-        secs = seconds % 60
+        minutes, secs = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
 
         if hours > 0:
             return f"{hours:02d}:{minutes:02d}:{secs:02d}"
@@ -307,21 +438,32 @@ def format_duration(seconds):
         return "00:00"
 
 
-def format_date(date_str):
-    """Format date to relative time (e.g., '2 days ago')"""
+# Relative-date buckets past the first week: (days below, days per unit, unit)
+_DATE_BUCKETS = (
+    (30, 7, "week"),
+    (365, 30, "month"),
+    (float("inf"), 365, "year"),
+)
+
+
+def format_date(date_str, now: Optional[datetime] = None):
+    """Format date to relative time (e.g., '2 days ago').
+
+    Pass `now` when formatting many rows so the clock is read once per page.
+    """
     if not date_str:
         return "Unknown"
     
     try:
-        # Parse the date string
+        # Parse the date string (fromisoformat accepts a trailing 'Z' since 3.11)
         if isinstance(date_str, str):
-            # Handle ISO format with timezone
-            date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+            date = datetime.fromisoformat(date_str)
         else:
             date = date_str
         
         # Calculate difference
-        now = datetime.now(date.tzinfo) if date.tzinfo else datetime.now()
+        if now is None or (now.tzinfo is None) != (date.tzinfo is None):
+            now = datetime.now(date.tzinfo) if date.tzinfo else datetime.now()
         diff = now - date
         
         # Format relative time
@@ -341,15 +483,11 @@ def format_date(date_str):
             return "Yesterday"
         elif days < 7:
             return f"{days} days ago"
-        elif days < 30:
-            weeks = days // 7
-            return f"{weeks} week{'s' if weeks != 1 else ''} ago"
-        elif days < 365:
-            months = days // 30
-            return f"{months} month{'s' if months != 1 else ''} ago"
-        else:
-            years = days // 365
-            return f"{years} year{'s' if years != 1 else ''} ago"
+
+        for limit, unit_days, unit in _DATE_BUCKETS:
+            if days < limit:
+                count = days // unit_days
+                return f"{count} {unit}{'s' if count != 1 else ''} ago"
     except Exception as e:
         logger.error(f"Error formatting date: {e}")
         return "Unknown"
@@ -364,6 +502,211 @@ def build_thumbnail_url(thumbnail: str) -> str:
     return f"/thumb/{quote(thumbnail, safe='')}"
 
 
+async def resolve_missing_short_ids(sb, videos: list, user_id: int) -> dict:
+    """Resolve short_ids for videos that lack one in a single batch.
+
+    Returns a mapping of file_id -> short_id. Failed lookups fall back to the
+    file_id itself so the caller can still build a working link.
+    """
+    missing = [v for v in videos if not v.get('short_id')]
+    return await bulk_get_or_create_short_links(sb, missing, user_id)
+
+
+async def save_video_with_short_link(sb, video_data: dict, user_id: int) -> Tuple[int, str]:
+    """Insert a video row and create its short link; returns (video_id, short_id).
+
+    Short links resolve by file_id until video_id is attached, so both rows are
+    written concurrently and linked afterwards (attach_video_to_short_link).
+    If the insert fails, the new link is deleted again before the error is
+    raised, so no short link outlives a video row that was never written.
+    """
+    insert_result, short_id = await asyncio.gather(
+        sb.table("videos").insert(video_data, returning="representation").execute(),
+        create_short_link(sb, video_data["file_id"], None, user_id),
+        return_exceptions=True
+    )
+
+    insert_error = insert_result if isinstance(insert_result, BaseException) else None
+    if insert_error is None and not insert_result.data:
+        insert_error = RuntimeError("video insert returned no id")
+    if insert_error is not None:
+        if not isinstance(short_id, BaseException):
+            await delete_short_link(sb, short_id)
+        raise insert_error
+    if isinstance(short_id, BaseException):
+        raise short_id
+
+    return insert_result.data[0]["id"], short_id
+
+
+def pick_reusable_upload(videos: list, user_id: int, quality: str) -> Optional[dict]:
+    """Choose an earlier upload of a URL that a new request can reuse.
+
+    Only uploads at the requested quality qualify; rows from before the quality
+    was recorded count as "best". The caller's own row wins over other users'.
+    """
+    requested = str(quality).lower()
+    candidates = [
+        video for video in videos
+        if video.get("file_id")
+        and not (video.get("metadata") or {}).get("is_audio")
+        and str((video.get("metadata") or {}).get("quality") or "best").lower() == requested
+    ]
+    for video in candidates:
+        if video.get("user_id") == user_id:
+            return video
+    return candidates[0] if candidates else None
+
+
+async def load_upload_file(path: str) -> InputFile:
+    """Read a local file for a Bot API upload in a worker thread.
+
+    PTB buffers the whole file before posting either way; reading it off the
+    event loop keeps other requests responsive meanwhile.
+    """
+    data = await asyncio.to_thread(Path(path).read_bytes)
+    return InputFile(data, filename=os.path.basename(path))
+
+
+def _sendfile_copy(src_fd: int, dest_path: str) -> int:
+    dest_fd = os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        offset = 0
+        while sent := os.sendfile(dest_fd, src_fd, offset, UPLOAD_SENDFILE_CHUNK_SIZE):
+            offset += sent
+        return offset
+    finally:
+        os.close(dest_fd)
+
+
+async def save_upload_to_disk(file: UploadFile, dest_path: str) -> int:
+    """Copy an uploaded file to `dest_path` and return its size in bytes.
+
+    Large uploads have already been spooled to a temp file by Starlette; on
+    Linux those are copied with sendfile so the data never passes through
+    userspace. In-memory uploads and other platforms use chunked async writes.
+    """
+    if sys.platform.startswith("linux") and getattr(file.file, "_rolled", False):
+        return await asyncio.to_thread(_sendfile_copy, file.file.fileno(), dest_path)
+
+    file_size = 0
+    async with aiofiles.open(dest_path, 'wb') as out_file:
+        while content := await file.read(UPLOAD_READ_CHUNK_SIZE):
+            await out_file.write(content)
+            file_size += len(content)
+    return file_size
+
+
+async def send_with_retries(send_func, label: str, attempts: int = 3):
+    """Run a Telegram send, retrying only transient failures.
+
+    Network errors and timeouts back off exponentially with jitter, flood
+    control waits for the server-provided delay, and everything else
+    (BadRequest, Forbidden, InvalidToken, local errors) is raised at once.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return await send_func()
+        except BadRequest:
+            # BadRequest subclasses NetworkError but is never transient
+            raise
+        except (NetworkError, RetryAfter) as send_error:
+            if attempt == attempts:
+                raise
+            if isinstance(send_error, RetryAfter):
+                delay = send_error.retry_after
+            else:
+                delay = min(2 ** attempt + random.random(), 30)
+            logger.warning(
+                "%s attempt %s/%s failed: %s (retrying in %.1fs)",
+                label,
+                attempt,
+                attempts,
+                send_error,
+                delay
+            )
+            await asyncio.sleep(delay)
+
+
+async def extract_thumbnail_jpeg(source_path: str, duration_hint: float) -> bytes:
+    """Grab a single JPEG frame ~10% into the video; returns b"" on failure."""
+    if not FFMPEG_PATH:
+        return b""
+
+    if duration_hint and duration_hint > 2:
+        thumb_time = min(max(duration_hint * 0.1, 1), duration_hint - 1)
+    else:
+        thumb_time = 1
+
+    # Write the JPEG to stdout instead of a temp file
+    cmd = [
+        FFMPEG_PATH,
+        "-ss", str(thumb_time),
+        "-i", source_path,
+        "-frames:v", "1",
+        "-q:v", "2",
+        "-f", "image2pipe",
+        "-vcodec", "mjpeg",
+        "pipe:1"
+    ]
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            # Cancelled uploads must not leave ffmpeg reading a file being deleted
+            if process.returncode is None:
+                process.kill()
+            raise
+        returncode = process.returncode
+    except NotImplementedError:
+        result = await asyncio.to_thread(
+            subprocess.run,
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        stdout = result.stdout
+        stderr = result.stderr
+        returncode = result.returncode
+
+    if returncode != 0 or not stdout:
+        error_msg = stderr.decode(errors="replace")
+        logger.warning("Thumbnail generation failed: %s", error_msg)
+        return b""
+
+    return stdout
+
+
+def _cleanup_paths(paths):
+    """Delete temporary files/directories.
+
+    Sync on purpose: handlers pass it to BackgroundTasks, which runs it in the
+    threadpool after the response has been sent.
+    """
+    for path in paths:
+        if not path:
+            continue
+        # Unlink first instead of stat-then-unlink; directories fail over to rmtree
+        try:
+            try:
+                os.unlink(path)
+            except (IsADirectoryError, PermissionError):
+                if not os.path.isdir(path):
+                    raise
+                shutil.rmtree(path)
+            logger.info("Temporary file deleted: %s", path)
+        except FileNotFoundError:
+            continue
+        except OSError as cleanup_error:
+            logger.error("Failed to cleanup temp file %s: %s", path, cleanup_error)
+
+
 # Mock DB or Bot interaction for now
 async def get_file_info_cached(file_id: str) -> Tuple[str, Optional[int]]:
     """
@@ -376,54 +719,57 @@ async def get_file_info_cached(file_id: str) -> Tuple[str, Optional[int]]:
     
     # Check cache
     now = time.time()
-    if file_id in file_info_cache:
-        cached = file_info_cache[file_id]
+    cached = file_info_cache.get(file_id)
+    if cached is not None:
         if now - cached.get("timestamp", 0) < CACHE_TTL:
             logger.debug(f"Cache hit for file_id={file_id}")
+            file_info_cache.move_to_end(file_id)
             return cached["url"], cached.get("size")
+        # Expired download URLs are dead weight even if the refetch below fails
+        del file_info_cache[file_id]
     
     # Cache miss or expired - fetch from Telegram
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    if not token:
+    if not TELEGRAM_BOT_TOKEN:
         raise HTTPException(status_code=500, detail="Bot token not valid")
     
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            f"https://api.telegram.org/bot{token}/getFile",
-            params={"file_id": file_id}
+    resp = await get_http_client().get(
+        TELEGRAM_GETFILE_URL,
+        params={"file_id": file_id}
+    )
+    data = orjson.loads(resp.content)
+    
+    if not data.get("ok"):
+        description = data.get("description", "Unknown error")
+        logger.error(
+            "Telegram getFile failed for file_id=%s: %s",
+            file_id,
+            description
         )
-        data = resp.json()
-        
-        if not data.get("ok"):
-            description = data.get("description", "Unknown error")
-            logger.error(
-                "Telegram getFile failed for file_id=%s: %s",
-                file_id,
-                description
+        if "file is too big" in description.lower():
+            raise HTTPException(
+                status_code=413,
+                detail="File too large for Telegram download. Reupload with smaller chunks."
             )
-            if "file is too big" in description.lower():
-                raise HTTPException(
-                    status_code=413,
-                    detail="File too large for Telegram download. Reupload with smaller chunks."
-                )
-            raise HTTPException(status_code=404, detail="File not found on Telegram")
-        
-        file_path = data["result"]["file_path"]
-        file_size = data["result"].get("file_size")
-        download_url = f"https://api.telegram.org/file/bot{token}/{file_path}"
-        
-        # Update cache
-        file_info_cache[file_id] = {
-            "url": download_url,
-            "size": file_size,
-            "timestamp": now
-        }
-        logger.debug(f"Cache updated for file_id={file_id}")
+        raise HTTPException(status_code=404, detail="File not found on Telegram")
+    
+    file_path = data["result"]["file_path"]
+    file_size = data["result"].get("file_size")
+    download_url = TELEGRAM_FILE_URL_PREFIX + file_path
+    
+    # Update cache
+    file_info_cache[file_id] = {
+        "url": download_url,
+        "size": file_size,
+        "timestamp": now
+    }
+    file_info_cache.move_to_end(file_id)
+    logger.debug(f"Cache updated for file_id={file_id}")
 
-        # Clean cache if needed
-        clean_cache_if_needed()
+    # Evict least recently used entries
+    while len(file_info_cache) > MAX_CACHE_SIZE:
+        file_info_cache.popitem(last=False)
 
-        return download_url, file_size
+    return download_url, file_size
 
 
 async def get_file_path_from_telegram(file_id):
@@ -445,13 +791,17 @@ def parse_range_header(range_header: str, file_size: int) -> Optional[Tuple[int,
     if not range_header:
         return None
     
-    # Parse "bytes=start-end" format
-    match = re.match(r'bytes=(\d+)-(\d*)', range_header)
-    if not match:
+    # Parse "bytes=start-end" format; only the first range of a list is served
+    if not range_header.startswith("bytes="):
+        return None
+    start_str, sep, end_str = range_header[6:].partition("-")
+    if not sep or not start_str.isdecimal():
+        return None
+    end_str = end_str.partition(",")[0]
+    if end_str and not end_str.isdecimal():
         return None
     
-    start = int(match.group(1))
-    end_str = match.group(2)
+    start = int(start_str)
     
     if end_str:
         end = int(end_str)
@@ -469,8 +819,9 @@ def parse_range_header(range_header: str, file_size: int) -> Optional[Tuple[int,
     return start, end
 
 
+@lru_cache(maxsize=MAX_CACHE_SIZE)
 def generate_etag(file_id: str) -> str:
-    """Generate ETag for a file using SHA-256."""
+    """Generate ETag for a file using SHA-256 (memoized per file_id)."""
     return hashlib.sha256(file_id.encode()).hexdigest()[:32]
 
 
@@ -485,13 +836,7 @@ async def health_check():
 @app.get("/watch/{short_id}", response_class=HTMLResponse)
 async def watch_video(request: Request, short_id: str):
     """Enhanced video watch page with metadata"""
-    from src.db import get_database, get_video_by_short_id, get_video_by_file_id
-    from src.link_shortener import get_or_create_short_link
-    
     try:
-        if not shutil.which("ffmpeg"):
-            raise HTTPException(status_code=500, detail="FFmpeg not available")
-
         video = await get_video_by_short_id(short_id)
         
         if not video:
@@ -599,17 +944,67 @@ async def watch_video(request: Request, short_id: str):
         })
 
 
+# Headers shared by every /stream response; Keep-Alive lets players reuse
+# the connection for follow-up range requests (60s, max 100 requests)
+_BASE_STREAM_HEADERS = {
+    "Accept-Ranges": "bytes",
+    "Cache-Control": "public, max-age=3600",
+    "Connection": "keep-alive",
+    "Keep-Alive": "timeout=60, max=100",
+}
+
+
+async def _proxy_stream(url: str, *, headers: Optional[dict] = None, timeout: Optional[httpx.Timeout] = None, label: str = "file"):
+    """Open an upstream GET on the shared client and return its body iterator.
+
+    The upstream status is checked before the caller builds its response, so a
+    Telegram failure becomes a 404/502 instead of an empty 200. Errors after
+    the body has started are re-raised, which aborts the connection rather
+    than ending a truncated download cleanly.
+    """
+    request_kwargs = {"headers": headers}
+    if timeout is not None:
+        request_kwargs["timeout"] = timeout
+
+    stack = AsyncExitStack()
+    try:
+        r = await stack.enter_async_context(
+            get_http_client().stream("GET", url, **request_kwargs)
+        )
+        r.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        await stack.aclose()
+        logger.error(f"Upstream {label} request failed: {e}")
+        status_code = 404 if e.response.status_code == 404 else 502
+        raise HTTPException(status_code=status_code, detail=f"Upstream {label} request failed")
+    except httpx.HTTPError as e:
+        await stack.aclose()
+        logger.error(f"Upstream {label} request failed: {e!r}")
+        raise HTTPException(status_code=502, detail=f"Upstream {label} request failed")
+
+    async def relay():
+        try:
+            async for chunk in r.aiter_bytes():
+                yield chunk
+        except Exception as e:
+            logger.error(f"Stream {label} error: {e!r}")
+            raise
+        finally:
+            await stack.aclose()
+
+    return relay()
+
+
 @app.get("/stream/{file_id}")
 async def stream_video(
     file_id: str,
     range: Optional[str] = Header(None),
-    if_none_match: Optional[str] = Header(None),
-    request: Request = None
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Proxy stream from Telegram to Browser with Range request support.
     Supports HTTP Range requests for video seeking.
-    Features adaptive chunk sizing based on network conditions.
+    Chunks are forwarded as they arrive from Telegram, without re-slicing.
     """
     try:
         # Get file info (URL and size) with caching
@@ -622,27 +1017,12 @@ async def stream_video(
         if if_none_match and if_none_match == etag:
             return Response(status_code=304)
 
-        # Determine optimal chunk size based on client hints
-        connection_speed = None
-        if request and request.headers:
-            # Try to get ECT (Effective Connection Type) from client hints
-            connection_speed = request.headers.get("ect") or request.headers.get("downlink")
-        chunk_size = get_adaptive_chunk_size(connection_speed)
-        logger.debug(f"Using chunk size: {chunk_size} bytes (connection: {connection_speed or 'unknown'})")
-
         # Parse Range header
         range_tuple = None
         if range and file_size:
             range_tuple = parse_range_header(range, file_size)
 
-        # Prepare headers with Keep-Alive for connection reuse
-        headers = {
-            "Accept-Ranges": "bytes",
-            "ETag": etag,
-            "Cache-Control": "public, max-age=3600",
-            "Connection": "keep-alive",
-            "Keep-Alive": "timeout=60, max=100",  # Keep connection alive for 60s, max 100 requests
-        }
+        headers = {**_BASE_STREAM_HEADERS, "ETag": etag}
         
         # Handle Range request
         if range_tuple and file_size:
@@ -654,28 +1034,10 @@ async def stream_video(
             
             logger.info(f"Range request: {start}-{end}/{file_size} for file_id={file_id}")
             
-            # Create a generator to stream the requested byte range
-            async def iter_range():
-                try:
-                    async with httpx.AsyncClient(
-                        timeout=httpx.Timeout(60.0, read=600.0),
-                        follow_redirects=True
-                    ) as client:
-                        # Request the specific range from Telegram
-                        range_headers = {"Range": f"bytes={start}-{end}"}
-                        async with client.stream("GET", download_url, headers=range_headers) as r:
-                            r.raise_for_status()
-                            async for chunk in r.aiter_bytes(chunk_size=chunk_size):
-                                yield chunk
-                except Exception as e:
-                    if "ClientDisconnected" in str(type(e).__name__) or isinstance(e, (OSError, asyncio.CancelledError)):
-                        logger.debug(f"Client disconnected during range stream: {e}")
-                    else:
-                        logger.error(f"Stream range error: {e}")
-                    return
-            
+            # Request the specific range from Telegram
+            range_headers = {"Range": f"bytes={start}-{end}"}
             return StreamingResponse(
-                iter_range(),
+                await _proxy_stream(download_url, headers=range_headers, label="range"),
                 status_code=206,
                 media_type="video/mp4",
                 headers=headers
@@ -685,52 +1047,40 @@ async def stream_video(
         if file_size:
             headers["Content-Length"] = str(file_size)
 
-        async def iter_file():
-            try:
-                async with httpx.AsyncClient(
-                    timeout=httpx.Timeout(60.0, read=600.0),
-                    follow_redirects=True
-                ) as client:
-                    async with client.stream("GET", download_url) as r:
-                        r.raise_for_status()
-                        async for chunk in r.aiter_bytes(chunk_size=chunk_size):
-                            yield chunk
-            except Exception as e:
-                if "ClientDisconnected" in str(type(e).__name__) or isinstance(e, (OSError, asyncio.CancelledError)):
-                    logger.debug(f"Client disconnected during file stream: {e}")
-                else:
-                    logger.error(f"Stream file error: {e}")
-                return
-        
         return StreamingResponse(
-            iter_file(),
+            await _proxy_stream(download_url),
             media_type="video/mp4",
             headers=headers
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error("Streaming error (%s): %r", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Telegram thumbnail file paths only carry these suffixes
+THUMBNAIL_CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+}
+
+
 @app.get("/thumb/{file_id}")
 async def stream_thumbnail(file_id: str):
     """Proxy stream for thumbnail images stored on Telegram."""
     try:
         download_url = await get_file_path_from_telegram(file_id)
-        content_type = mimetypes.guess_type(download_url)[0] or "image/jpeg"
-
-        async def iter_file():
-            async with httpx.AsyncClient(
-                timeout=httpx.Timeout(60.0, read=300.0),
-                follow_redirects=True
-            ) as client:
-                async with client.stream("GET", download_url) as r:
-                    r.raise_for_status()
-                    async for chunk in r.aiter_bytes():
-                        yield chunk
+        extension = os.path.splitext(download_url)[1].lower()
+        content_type = THUMBNAIL_CONTENT_TYPES.get(extension, "image/jpeg")
 
-        return StreamingResponse(iter_file(), media_type=content_type)
+        return StreamingResponse(
+            await _proxy_stream(download_url, timeout=httpx.Timeout(60.0, read=300.0), label="thumbnail"),
+            media_type=content_type
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -744,8 +1094,6 @@ async def stream_concat(short_id: str):
     Proxy stream for multi-part videos by concatenating parts with ffmpeg.
     Improved with better chunk size and buffering.
     """
-    from src.db import get_video_by_short_id
-
     try:
         video = await get_video_by_short_id(short_id)
         if not video:
@@ -774,63 +1122,23 @@ async def stream_concat(short_id: str):
             *[get_file_path_from_telegram(fid) for fid in file_ids]
         )
 
-        async def download_with_retries(client, url, dest_path, label):
-            last_error = None
-            for attempt in range(1, 4):
-                try:
-                    async with client.stream("GET", url) as r:
-                        r.raise_for_status()
-                        with open(dest_path, "wb") as out_file:
-                            async for chunk in r.aiter_bytes(chunk_size=131072):  # 128KB chunks
-                                out_file.write(chunk)
-                    return
-                except Exception as err:
-                    last_error = err
-                    if attempt < 3:
-                        logger.warning(
-                            "Part download failed (%s attempt %s/3): %s",
-                            label,
-                            attempt,
-                            err
-                        )
-                        await asyncio.sleep(2 * attempt)
-            raise last_error
-
-        temp_dir = tempfile.mkdtemp()
-        list_path = os.path.join(temp_dir, "concat.txt")
-        local_paths = []
-        try:
-            async with httpx.AsyncClient(
-                timeout=httpx.Timeout(60.0, read=600.0),
-                follow_redirects=True
-            ) as client:
-                for idx, url in enumerate(download_urls, start=1):
-                    local_path = os.path.join(temp_dir, f"part_{idx}.mp4")
-                    await download_with_retries(
-                        client,
-                        url,
-                        local_path,
-                        f"part {idx}"
-                    )
-                    local_paths.append(local_path)
+        if not FFMPEG_PATH:
+            raise HTTPException(status_code=500, detail="FFmpeg not available")
 
-            with open(list_path, "w", encoding="utf-8") as list_file:
-                for path in local_paths:
-                    list_file.write(f"file '{path}'\n")
-        except Exception:
-            try:
-                shutil.rmtree(temp_dir)
-            except Exception:
-                pass
-            raise
+        # ffmpeg pulls the parts straight from Telegram (no local copies), so
+        # the response starts as soon as the first part's headers are read
+        list_fd, list_path = tempfile.mkstemp(suffix=".txt")
+        with os.fdopen(list_fd, "w", encoding="utf-8") as list_file:
+            list_file.write("".join(f"file '{url}'\n" for url in download_urls))
 
         cmd = [
-            "ffmpeg",
+            FFMPEG_PATH,
             "-hide_banner",
             "-loglevel", "error",
             "-fflags", "+genpts+igndts",  # Ignore DTS for smoother concat
             "-f", "concat",
             "-safe", "0",
+            "-protocol_whitelist", "file,http,https,tcp,tls",
             "-i", list_path,
             "-c", "copy",
             "-avoid_negative_ts", "make_zero",
@@ -841,12 +1149,27 @@ async def stream_concat(short_id: str):
         ]
 
         try:
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+            except NotImplementedError:
+                process = subprocess.Popen(
+                    cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE
+                )
+        except BaseException:
+            # The list holds token-bearing Telegram URLs; never leave it behind
+            try:
+                os.unlink(list_path)
+            except OSError:
+                pass
+            raise
 
+        if not isinstance(process, subprocess.Popen):
             async def iter_concat():
                 try:
                     while True:
@@ -872,22 +1195,16 @@ async def stream_concat(short_id: str):
                         except Exception:
                             pass
                     try:
-                        shutil.rmtree(temp_dir)
-                    except Exception:
+                        os.unlink(list_path)
+                    except OSError:
                         pass
-        except NotImplementedError:
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-
+        else:
             async def iter_concat():
                 try:
                     while True:
-                        # Increased chunk size for better throughput
+                        # Each read costs a thread hop, so match the 1MB pipe reads above
                         chunk = await asyncio.to_thread(
-                            process.stdout.read, 1024 * 512
+                            process.stdout.read, 1024 * 1024
                         )
                         if not chunk:
                             break
@@ -908,8 +1225,8 @@ async def stream_concat(short_id: str):
                         except Exception:
                             process.kill()
                     try:
-                        shutil.rmtree(temp_dir)
-                    except Exception:
+                        os.unlink(list_path)
+                    except OSError:
                         pass
 
         return StreamingResponse(
@@ -931,34 +1248,16 @@ async def stream_concat(short_id: str):
 @app.get("/gallery/{user_id}", response_class=HTMLResponse)
 async def gallery_page(request: Request, user_id: int):
     """Gallery page showing user's videos"""
-    from src.db import get_database, get_user_videos
-    from src.link_shortener import get_or_create_short_link
-    
     try:
         sb = await get_database()
         videos = await get_user_videos(user_id, limit=100)
         
+        short_ids = await resolve_missing_short_ids(sb, videos, user_id)
+        now = datetime.now(timezone.utc)
         formatted_videos = []
         for video in videos:
-            short_id = video.get('short_id', '')
-            if not short_id:
-                file_id = video.get('file_id')
-                if file_id:
-                    try:
-                        short_id = await get_or_create_short_link(
-                            sb,
-                            file_id,
-                            video.get('id'),
-                            user_id
-                        )
-                    except Exception as short_error:
-                        logger.warning(
-                            "Short link lookup failed for file_id=%s: %s",
-                            file_id,
-                            short_error
-                        )
-                        short_id = file_id or ''
-            
+            short_id = video.get('short_id') or short_ids.get(video.get('file_id'), '')
+
             formatted_videos.append({
                 'id': video.get('id'),
                 'short_id': short_id,
@@ -966,14 +1265,14 @@ async def gallery_page(request: Request, user_id: int):
                 'thumbnail': build_thumbnail_url(video.get('thumbnail', '')),
                 'duration_formatted': format_duration(video.get('duration', 0)),
                 'views': video.get('views', 0),
-                'date': format_date(video.get('created_at'))
+                'date': format_date(video.get('created_at'), now)
             })
         
         return templates.TemplateResponse("gallery.html", {
             "request": request,
             "user_id": user_id,
-            "videos": formatted_videos,
-            "videos_json": json.dumps(formatted_videos)
+            # The template hydrates from the JSON blob only
+            "videos_json": orjson.dumps(formatted_videos).decode()
         })
     except Exception as e:
         logger.error(f"Error in gallery_page: {e}")
@@ -993,29 +1292,16 @@ async def gallery_default_page(request: Request):
 @app.get("/encoded/{user_id}", response_class=HTMLResponse)
 async def encoded_page(request: Request, user_id: int):
     """Page for managing encoded videos"""
-    from src.db import get_encoded_videos, get_database
-    from src.link_shortener import get_or_create_short_link
-
     try:
         sb = await get_database()
         videos = await get_encoded_videos(user_id, limit=100)
         
+        short_ids = await resolve_missing_short_ids(sb, videos, user_id)
+        now = datetime.now(timezone.utc)
         formatted_videos = []
         for video in videos:
-            short_id = video.get('short_id', '')
-            if not short_id:
-                file_id = video.get('file_id')
-                if file_id:
-                    try:
-                        short_id = await get_or_create_short_link(
-                            sb,
-                            file_id,
-                            video.get('id'),
-                            user_id
-                        )
-                    except Exception:
-                        short_id = file_id or ''
-            
+            short_id = video.get('short_id') or short_ids.get(video.get('file_id'), '')
+
             metadata = video.get("metadata") or {}
             encoded_size = 0
             encoded_path = metadata.get("encoded_path")
@@ -1029,7 +1315,7 @@ async def encoded_page(request: Request, user_id: int):
                 'thumbnail': build_thumbnail_url(video.get('thumbnail', '')),
                 'duration_formatted': format_duration(video.get('duration', 0)),
                 'size_mb': round(encoded_size / (1024 * 1024), 1),
-                'date': format_date(video.get('created_at'))
+                'date': format_date(video.get('created_at'), now)
             })
         
         return templates.TemplateResponse("encoded.html", {
@@ -1055,8 +1341,6 @@ async def encoded_default_page(request: Request):
 @app.delete("/api/encoded/delete/{short_id}")
 async def delete_encoded_file(short_id: str, user_id: Optional[int] = Body(None)):
     """Delete the encoded file only (keep original video)"""
-    from src.db import get_video_by_short_id, get_database
-    
     try:
         video = await get_video_by_short_id(short_id)
         if not video:
@@ -1074,12 +1358,15 @@ async def delete_encoded_file(short_id: str, user_id: Optional[int] = Body(None)
                 # Continue to update DB anyway
         
         # Update metadata
+        metadata = {k: v for k, v in metadata.items() if k != "encoded_path"}
         metadata["is_encoded"] = False
-        if "encoded_path" in metadata:
-            del metadata["encoded_path"]
             
         sb = await get_database()
-        await sb.table("videos").update({"metadata": metadata}).eq("id", video["id"]).execute()
+        try:
+            await sb.table("videos").update({"metadata": metadata}).eq("id", video["id"]).execute()
+        finally:
+            # The file may already be gone even if the update failed
+            forget_cached_video(video["id"])
         
         return {"success": True, "message": "Optimized file deleted"}
         
@@ -1091,23 +1378,16 @@ async def delete_encoded_file(short_id: str, user_id: Optional[int] = Body(None)
 @app.get("/favorites/{user_id}", response_class=HTMLResponse)
 async def favorites_page(request: Request, user_id: int):
     """Favorites page showing user's favorite videos"""
-    from src.db import get_user_favorites
-    from src.link_shortener import get_or_create_short_link, get_database
-
     try:
         videos = await get_user_favorites(user_id, limit=100)
 
-        # Add short links for each video
+        # Add short links for all videos in one batch
         db = await get_database()
+        short_ids = await bulk_get_or_create_short_links(db, videos, user_id)
         for video in videos:
-            if video.get('file_id'):
-                short_id = await get_or_create_short_link(
-                    db,
-                    video['file_id'],
-                    video.get('id'),
-                    user_id
-                )
-                video['short_id'] = short_id
+            file_id = video.get('file_id')
+            if file_id:
+                video['short_id'] = short_ids.get(file_id, file_id)
 
         return templates.TemplateResponse("favorites.html", {
             "request": request,
@@ -1179,14 +1459,13 @@ async def get_queue_status():
 @app.post("/api/increment-view/{short_id}")
 async def increment_view(short_id: str, request: Request):
     """Increment view counter for a video (public endpoint)"""
-    from src.db import increment_view_count_by_short_id
-    
     try:
         # Get client info
         client_host = request.client.host if request.client else None
         user_agent = request.headers.get("user-agent", "")
         
-        await increment_view_count_by_short_id(short_id, client_host, user_agent)
+        # Buffered in memory; flush_views_periodically() writes the counts
+        queue_view(short_id, client_host, user_agent)
         return {"success": True, "message": "View count incremented"}
     except Exception as e:
         logger.error(f"Error incrementing view: {e}")
@@ -1197,15 +1476,14 @@ async def increment_view(short_id: str, request: Request):
 @app.get("/api/resolve/{short_id}")
 async def resolve_short_link(short_id: str):
     """Resolve short link to video data (public endpoint)"""
-    from src.db import get_video_by_short_id
-    
     try:
         video = await get_video_by_short_id(short_id)
         
         if not video:
             raise HTTPException(status_code=404, detail="Video not found")
         
-        return {
+        # Rows are plain JSON already; returning a Response skips jsonable_encoder
+        return ORJSONResponse({
             "success": True,
             "data": {
                 "file_id": video.get('file_id'),
@@ -1214,7 +1492,7 @@ async def resolve_short_link(short_id: str):
                 "views": video.get('views', 0),
                 "created_at": video.get('created_at')
             }
-        }
+        })
     except HTTPException:
         raise
     except Exception as e:
@@ -1222,12 +1500,14 @@ async def resolve_short_link(short_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Path separators and characters Windows forbids in filenames
+_FILENAME_TRANSLATION = str.maketrans({c: "_" for c in '/\\:*?"<>|'})
+
+
 # Download endpoint
 @app.get("/download/{short_id}")
 async def download_video(short_id: str):
     """Download video file directly (prioritize encoded file)"""
-    from src.db import get_video_by_short_id
-    
     try:
         video = await get_video_by_short_id(short_id)
         if not video:
@@ -1241,7 +1521,7 @@ async def download_video(short_id: str):
         
         if is_encoded and encoded_path and os.path.exists(encoded_path):
             title = video.get('title', 'video')
-            filename = f"{title}.mp4".replace('/', '_').replace('\\', '_')
+            filename = f"{title}.mp4".translate(_FILENAME_TRANSLATION)
             logger.info(f"Serving encoded file for download: {encoded_path}")
             return FileResponse(
                 path=encoded_path,
@@ -1253,7 +1533,7 @@ async def download_video(short_id: str):
         parts = metadata.get("parts") or []
         if parts:
             title = video.get('title', 'video')
-            filename = f"{title}.mp4".replace('/', '_').replace('\\', '_')
+            filename = f"{title}.mp4".translate(_FILENAME_TRANSLATION)
             response = await stream_concat(short_id)
             response.headers["Content-Disposition"] = (
                 f"attachment; filename=\"{filename}\""
@@ -1267,18 +1547,12 @@ async def download_video(short_id: str):
         # Get download URL from Telegram
         download_url = await get_file_path_from_telegram(file_id)
         
-        # Stream the file with download headers
-        async def iter_file():
-            async with httpx.AsyncClient(timeout=None) as client:
-                async with client.stream("GET", download_url) as r:
-                    async for chunk in r.aiter_bytes():
-                        yield chunk
-        
         title = video.get('title', 'video')
-        filename = f"{title}.mp4".replace('/', '_').replace('\\', '_')
+        filename = f"{title}.mp4".translate(_FILENAME_TRANSLATION)
         
+        # Stream the file with download headers over the pooled client
         return StreamingResponse(
-            iter_file(), 
+            await _proxy_stream(download_url, label="download"),
             media_type="video/mp4",
             headers={"Content-Disposition": f"attachment; filename=\"{filename}\""}
         )
@@ -1290,14 +1564,23 @@ async def download_video(short_id: str):
 
 
 # Protected API endpoints (require X-API-Key header)
-from src.api_auth import verify_api_key
-
 
 
+def encode_video_cursor(keyset: Tuple[str, int]) -> str:
+    """Opaque keyset cursor for the position just after (created_at, id)."""
+    created_at, video_id = keyset
+    raw = f"{created_at}|{video_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
 
-# Protected API endpoints (require X-API-Key header)
-from src.api_auth import verify_api_key
+def decode_video_cursor(cursor: str) -> Tuple[str, int]:
+    """Inverse of encode_video_cursor; raises ValueError on malformed input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, video_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at).isoformat(), int(video_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
 
 @app.get("/api/videos")
@@ -1307,30 +1590,57 @@ async def list_videos(
     per_page: int = 20,
     filter: str = "all",
     search: str = "",
+    after: Optional[str] = None,
     api_key: str = Header(None, alias="X-API-Key")
 ):
-    """List videos with pagination (requires API key)"""
-    from src.api_auth import verify_api_key
-    
+    """
+    List videos with pagination (requires API key).
+    Pass the previous response's `next_cursor` as `after` to page by keyset;
+    `page` is only used when no cursor is given.
+    """
     # Verify API key if configured
-    try:
-        await verify_api_key(api_key)
-    except:
-        pass  # Allow if no API key configured
-    
-    from src.db import get_user_videos
+    await verify_api_key(api_key)
     
     try:
+        keyset = None
+        if after:
+            try:
+                keyset = decode_video_cursor(after)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        cache_key = ("videos", user_id, page, per_page, filter, search, after)
+        cached = api_cache.get(cache_key)
+        if cached is not None:
+            return ORJSONResponse(cached)
+
         offset = (page - 1) * per_page
-        videos = await get_user_videos(user_id, filter=filter, search=search, limit=per_page, offset=offset)
+        (videos, next_keyset), total = await asyncio.gather(
+            get_user_videos(
+                user_id,
+                filter=filter,
+                search=search,
+                limit=per_page,
+                offset=offset,
+                after=keyset,
+                with_next_keyset=True
+            ),
+            get_video_count(user_id, filter=filter, search=search, estimated=True)
+        )
         
-        return {
+        body = {
             "success": True,
             "data": videos,
             "page": page,
             "per_page": per_page,
-            "total": len(videos)
+            "total": total,
+            # None on the last page; favorites keep offset paging
+            "next_cursor": encode_video_cursor(next_keyset) if next_keyset else None
         }
+        api_cache.set(cache_key, body)
+        return ORJSONResponse(body)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing videos: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1345,13 +1655,7 @@ async def get_video_by_url_api(
     Get video by original URL.
     This allows looking up videos downloaded via Telegram bot from the web.
     """
-    try:
-        await verify_api_key(api_key)
-    except:
-        pass
-
-    from src.db import get_video_by_url
-    from src.link_shortener import get_or_create_short_link
+    await verify_api_key(api_key)
 
     try:
         video = await get_video_by_url(url)
@@ -1389,12 +1693,7 @@ async def get_video_details(
     api_key: str = Header(None, alias="X-API-Key")
 ):
     """Get video details by ID (requires API key)"""
-    try:
-        await verify_api_key(api_key)
-    except:
-        pass
-
-    from src.db import get_video_by_id
+    await verify_api_key(api_key)
 
     try:
         video = await get_video_by_id(video_id)
@@ -1402,10 +1701,10 @@ async def get_video_details(
         if not video:
             raise HTTPException(status_code=404, detail="Video not found")
 
-        return {
+        return ORJSONResponse({
             "success": True,
             "data": video
-        }
+        })
     except HTTPException:
         raise
     except Exception as e:
@@ -1420,17 +1719,13 @@ async def delete_video(
     api_key: str = Header(None, alias="X-API-Key")
 ):
     """Delete video by ID (requires API key)"""
-    try:
-        await verify_api_key(api_key)
-    except:
-        pass
-    
-    from src.db import delete_video_by_id
+    await verify_api_key(api_key)
     
     try:
         success, message = await delete_video_by_id(video_id, user_id)
         
         if success:
+            invalidate_user_page_cache(user_id)
             return {"success": True, "message": message}
         else:
             status_code = 404
@@ -1450,24 +1745,26 @@ async def get_user_stats(
     api_key: str = Header(None, alias="X-API-Key")
 ):
     """Get user statistics (requires API key)"""
-    try:
-        await verify_api_key(api_key)
-    except:
-        pass
-    
-    from src.user_manager import get_user_stats
-    from src.db import get_database
+    await verify_api_key(api_key)
     
     try:
-        stats = await get_user_stats(await get_database(), user_id)
+        cache_key = ("stats", user_id)
+        cached = api_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Module-qualified: this endpoint's own name shadows get_user_stats
+        stats = await user_manager.get_user_stats(await get_database(), user_id)
         
         if not stats:
             raise HTTPException(status_code=404, detail="User not found")
         
-        return {
+        body = {
             "success": True,
             "data": stats
         }
+        api_cache.set(cache_key, body)
+        return body
     except HTTPException:
         raise
     except Exception as e:
@@ -1481,20 +1778,22 @@ async def get_favorites(
     api_key: str = Header(None, alias="X-API-Key")
 ):
     """Get user's favorite videos (requires API key)"""
-    try:
-        await verify_api_key(api_key)
-    except:
-        pass
-    
-    from src.db import get_favorite_videos
+    await verify_api_key(api_key)
     
     try:
+        cache_key = ("favorites", user_id)
+        cached = api_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         favorites = await get_favorite_videos(user_id)
         
-        return {
+        body = {
             "success": True,
             "data": favorites
         }
+        api_cache.set(cache_key, body)
+        return body
     except Exception as e:
         logger.error(f"Error getting favorites: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1561,14 +1860,17 @@ async def toggle_favorite(
 ):
     """Toggle favorite status for a video"""
     try:
-        from src.db import is_favorite, add_favorite, remove_favorite
-
         # Check current status
         is_fav = await is_favorite(user_id, video_id)
 
+        # Invalidate only after the write, so a concurrent read cannot cache
+        # the old list again in between
         if is_fav:
             # Remove from favorites
-            success = await remove_favorite(user_id, video_id)
+            try:
+                success = await remove_favorite(user_id, video_id)
+            finally:
+                invalidate_user_favorites_cache(user_id)
             return {
                 "success": success,
                 "is_favorite": False,
@@ -1576,7 +1878,10 @@ async def toggle_favorite(
             }
         else:
             # Add to favorites
-            success = await add_favorite(user_id, video_id)
+            try:
+                success = await add_favorite(user_id, video_id)
+            finally:
+                invalidate_user_favorites_cache(user_id)
             return {
                 "success": success,
                 "is_favorite": True,
@@ -1606,10 +1911,9 @@ async def get_subtitle(file_id: str):
         # Download from Telegram
         download_url, _ = await get_file_info_cached(file_id)
         
-        async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
-            resp = await client.get(download_url)
-            resp.raise_for_status()
-            content_bytes = resp.content
+        resp = await get_http_client().get(download_url, timeout=60.0)
+        resp.raise_for_status()
+        content_bytes = resp.content
             
         # Detect encoding
         encoding = detect_encoding(content_bytes)
@@ -1664,11 +1968,18 @@ async def stream_progress(task_id: str):
     async def event_generator():
         try:
             while True:
+                # Created together with the download_progress entry; unknown
+                # task ids never get one
+                event = progress_events.get(task_id)
+                if event is not None:
+                    # Clear before reading so an update made after the read still wakes us
+                    event.clear()
+
                 # Get progress from global dict
                 progress_data = download_progress.get(task_id)
 
-                if not progress_data:
-                    yield f"data: {json.dumps({'error': 'Task not found'})}\n\n"
+                if not progress_data or event is None:
+                    yield b"data: " + orjson.dumps({'error': 'Task not found'}) + b"\n\n"
                     await asyncio.sleep(1)
                     continue
 
@@ -1681,19 +1992,22 @@ async def stream_progress(task_id: str):
                     "error": progress_data.get("error")
                 }
 
-                yield f"data: {json.dumps(data)}\n\n"
+                yield b"data: " + orjson.dumps(data) + b"\n\n"
 
                 # Stop streaming if task completed or failed
                 if progress_data.get("status") in ["completed", "failed", "cancelled"]:
                     break
 
-                # Wait before next update
-                await asyncio.sleep(0.5)
+                # Wait for the next update; a comment line keeps idle connections open
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=PROGRESS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
         except asyncio.CancelledError:
             logger.info(f"SSE connection closed for task {task_id}")
         except Exception as e:
             logger.error(f"Error in SSE stream: {e}")
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield b"data: " + orjson.dumps({'error': str(e)}) + b"\n\n"
 
     return StreamingResponse(
         event_generator(),
@@ -1708,6 +2022,7 @@ async def stream_progress(task_id: str):
 
 @app.post("/api/web-download")
 async def web_download(
+    background_tasks: BackgroundTasks,
     url: str = Body(...),
     quality: str = Body("best"),
     user_id: Optional[int] = Body(None)
@@ -1729,30 +2044,90 @@ async def web_download(
         "title": "Preparing...",
         "error": None
     }
+    progress_events[task_id] = asyncio.Event()
+    loop = asyncio.get_running_loop()
 
     try:
         logger.info(f"Starting web download: {url} (task_id: {task_id})")
         logger.info(f"Admin User ID for notifications: {DEFAULT_USER_ID}")
 
+        is_audio = str(quality).lower() in {"audio", "bestaudio"}
+
+        # A URL that was already uploaded at this quality only needs a row and
+        # short link; audio requests still download because stored rows are
+        # normally the video
+        existing_video = None
+        if not is_audio:
+            try:
+                existing_video = pick_reusable_upload(
+                    await get_videos_by_url(url), user_id, quality
+                )
+            except Exception as lookup_error:
+                logger.warning("Existing video lookup failed: %s", lookup_error)
+
+        if existing_video:
+            sb = await get_database()
+            if existing_video.get("user_id") == user_id:
+                short_id = await get_or_create_short_link(
+                    sb,
+                    existing_video["file_id"],
+                    existing_video.get("id"),
+                    user_id
+                )
+            else:
+                # Another user's upload: give this user a row of their own
+                # that points at the same Telegram file
+                video_data = {
+                    key: existing_video[key]
+                    for key in ("file_id", "title", "duration", "thumbnail", "metadata")
+                    if existing_video.get(key) is not None
+                }
+                video_data["user_id"] = user_id
+                video_data["url"] = url
+                video_id, short_id = await save_video_with_short_link(sb, video_data, user_id)
+                background_tasks.add_task(attach_video_to_short_link, sb, short_id, video_id)
+                invalidate_user_page_cache(user_id)
+            title = existing_video.get("title") or "video"
+            logger.info(f"Reusing existing upload for {url} (short_id: {short_id})")
+
+            download_progress[task_id]['status'] = 'completed'
+            download_progress[task_id]['progress'] = 100
+            download_progress[task_id]['title'] = title
+            finish_download_progress(task_id)
+
+            return {
+                "success": True,
+                "task_id": task_id,
+                "short_id": short_id,
+                "title": title,
+                "message": "✅ Already downloaded!"
+            }
+
         # Progress hook for yt-dlp
         def progress_hook(d):
             if d['status'] == 'downloading':
                 try:
                     total = d.get('total_bytes') or d.get('total_bytes_estimate') or 1
                     downloaded = d.get('downloaded_bytes', 0)
-                    progress = (downloaded / total) * 100
-                    download_progress[task_id]['progress'] = min(progress, 99)
+                    progress = min((downloaded / total) * 100, 99)
+                    previous = download_progress[task_id]['progress']
+                    download_progress[task_id]['progress'] = progress
                     download_progress[task_id]['title'] = d.get('filename', 'Downloading...')
+                    # The hook runs in yt-dlp's worker thread; only wake SSE
+                    # clients when the whole-percent value moves
+                    if int(progress) != int(previous):
+                        loop.call_soon_threadsafe(signal_download_progress, task_id)
                 except Exception as e:
                     logger.error(f"Progress hook error: {e}")
 
         # Download video using yt-dlp to temporary directory
         import yt_dlp
 
-        temp_dir = tempfile.mkdtemp()
+        # Each task gets its own subdirectory of the shared scratch root
+        temp_dir = os.path.join(get_work_dir(), task_id)
+        os.makedirs(temp_dir)
         output_template = os.path.join(temp_dir, '%(title)s.%(ext)s')
 
-        is_audio = str(quality).lower() in {"audio", "bestaudio"}
         if is_audio:
             format_spec = "bestaudio/best"
         elif str(quality).isdigit():
@@ -1797,15 +2172,19 @@ async def web_download(
                 'preferredcodec': 'mp3',
             }]
         
-        try:
+        def run_yt_dlp():
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=True)
-                title = info.get('title', 'video')
-                downloaded_file = ydl.prepare_filename(info)
-                
-                # Handle audio conversion
-                if quality == 'audio':
-                    downloaded_file = str(Path(downloaded_file).with_suffix('.mp3'))
+                return info, ydl.prepare_filename(info)
+
+        try:
+            # yt-dlp blocks for the whole download; keep it off the event loop
+            info, downloaded_file = await asyncio.to_thread(run_yt_dlp)
+            title = info.get('title', 'video')
+            
+            # Handle audio conversion
+            if quality == 'audio':
+                downloaded_file = str(Path(downloaded_file).with_suffix('.mp3'))
         except Exception as dl_error:
             # Check for ConnectionResetError or similar transport errors typical of blocking
             error_str = str(dl_error)
@@ -1830,37 +2209,12 @@ async def web_download(
             pass
 
         # Upload to Telegram
-        from telegram import Bot
         from telegram.constants import ParseMode
-        from telegram.request import HTTPXRequest
 
-        request = HTTPXRequest(
-            connect_timeout=60,
-            read_timeout=600,
-            write_timeout=600,
-            pool_timeout=60
-        )
-        bot = Bot(token=bot_token, request=request)
-
-        async def send_with_retries(send_func, label):
-            last_error = None
-            for attempt in range(1, 4):
-                try:
-                    return await send_func()
-                except Exception as send_error:
-                    last_error = send_error
-                    if attempt < 3:
-                        logger.warning(
-                            "%s attempt %s/3 failed: %s",
-                            label,
-                            attempt,
-                            send_error
-                        )
-                        await asyncio.sleep(2 * attempt)
-            raise last_error
+        bot = get_bot()
 
         async def create_thumbnail_file(source_path: str, duration_hint: float) -> str:
-            if not shutil.which("ffmpeg"):
+            if not FFMPEG_PATH:
                 return ""
 
             if duration_hint and duration_hint > 2:
@@ -1868,19 +2222,29 @@ async def web_download(
             else:
                 thumb_time = 1
 
+            # Kept inside temp_dir so the download cleanup also covers it
             tmp_thumb = tempfile.NamedTemporaryFile(
                 delete=False,
-                suffix=".jpg"
+                suffix=".jpg",
+                dir=temp_dir
             )
             tmp_thumb.close()
 
+            # Input seek to the nearest keyframe and decode keyframes only, so
+            # no frames between it and thumb_time are decoded; a 320px-wide
+            # preview is all the gallery shows, and it encodes far faster
             cmd = [
-                "ffmpeg",
+                FFMPEG_PATH,
                 "-y",
                 "-ss", str(thumb_time),
+                "-noaccurate_seek",
+                "-skip_frame", "nokey",
                 "-i", source_path,
                 "-frames:v", "1",
-                "-q:v", "2",
+                "-an", "-sn", "-dn",
+                "-vf", "scale=320:-2",
+                "-f", "image2",
+                "-q:v", "5",
                 tmp_thumb.name
             ]
 
@@ -1917,31 +2281,30 @@ async def web_download(
         async def upload_thumbnail(path: str) -> str:
             if not path:
                 return ""
-            with open(path, "rb") as image_file:
-                message = await send_with_retries(
-                    lambda: bot.send_photo(
-                        chat_id=upload_chat_id,
-                        photo=image_file,
-                        caption="🖼️ Thumbnail"
-                    ),
-                    "send_photo"
-                )
+            image_file = await load_upload_file(path)
+            message = await send_with_retries(
+                lambda: bot.send_photo(
+                    chat_id=upload_chat_id,
+                    photo=image_file,
+                    caption="🖼️ Thumbnail"
+                ),
+                "send_photo"
+            )
             if message.photo:
                 return message.photo[-1].file_id
             return ""
 
         async def send_document(path, caption):
-            with open(path, "rb") as video_file:
-                return await bot.send_document(
-                    chat_id=upload_chat_id,
-                    document=video_file,
-                    caption=caption,
-                    parse_mode=ParseMode.HTML
-                )
+            return await bot.send_document(
+                chat_id=upload_chat_id,
+                document=await load_upload_file(path),
+                caption=caption,
+                parse_mode=ParseMode.HTML
+            )
 
-        file_size = os.path.getsize(downloaded_file) if downloaded_file else 0
+        file_size = await asyncio.to_thread(os.path.getsize, downloaded_file) if downloaded_file else 0
         if not is_audio and file_size > MAX_WEB_UPLOAD_SIZE:
-            if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
+            if not FFMPEG_PATH or not FFPROBE_PATH:
                 raise Exception(
                     "FFmpeg/ffprobe not found. Install FFmpeg and ensure "
                     "ffmpeg/ffprobe are available in PATH."
@@ -1951,7 +2314,6 @@ async def web_download(
                 "Downloaded file exceeds limit (%.1fMB). Splitting before upload.",
                 file_size / (1024 * 1024)
             )
-            from src.splitter import split_video, get_video_duration
 
             total_duration = info.get("duration") or 0
             if not total_duration:
@@ -1962,29 +2324,33 @@ async def web_download(
 
             parts = await split_video(downloaded_file, MAX_WEB_UPLOAD_SIZE, transcode=False)
             total_parts = len(parts)
-            parts_metadata = []
-            master_file_id = None
-            master_thumbnail = ""
-            thumbnail_temp_path = ""
 
-            try:
-                thumbnail_temp_path = await create_thumbnail_file(
-                    downloaded_file,
-                    total_duration
-                )
-                if thumbnail_temp_path:
-                    master_thumbnail = await upload_thumbnail(thumbnail_temp_path)
-            except Exception as thumb_error:
-                logger.warning("Thumbnail upload failed: %s", thumb_error)
+            async def create_master_thumbnail() -> str:
+                try:
+                    thumbnail_path = await create_thumbnail_file(
+                        downloaded_file,
+                        total_duration
+                    )
+                    if thumbnail_path:
+                        return await upload_thumbnail(thumbnail_path)
+                except Exception as thumb_error:
+                    logger.warning("Thumbnail upload failed: %s", thumb_error)
+                return ""
 
-            for index, part_path in enumerate(parts, start=1):
+            # Thumbnail extraction/upload overlaps the part uploads
+            thumbnail_task = asyncio.create_task(create_master_thumbnail())
+
+            upload_semaphore = asyncio.Semaphore(TELEGRAM_UPLOAD_CONCURRENCY)
+
+            async def upload_indexed_part(index, part_path):
                 part_title = f"{title} (Part {index}/{total_parts})"
                 caption = f"🌐 <b>Web Download</b>\n🎬 {part_title}\n🔗 {url[:100]}..."
 
-                message = await send_with_retries(
-                    lambda: send_document(part_path, caption),
-                    "send_document"
-                )
+                async with upload_semaphore:
+                    message = await send_with_retries(
+                        lambda: send_document(part_path, caption),
+                        "send_document"
+                    )
                 if message.document:
                     part_file_id = message.document.file_id
                     part_duration = 0
@@ -2000,27 +2366,40 @@ async def web_download(
                     except Exception:
                         part_duration = 0
 
-                if master_file_id is None:
-                    master_file_id = part_file_id
-
-                parts_metadata.append({
+                return {
                     "part": index,
                     "total": total_parts,
                     "title": part_title,
                     "file_id": part_file_id,
                     "duration": part_duration or 0,
                     "type": "video"
-                })
+                }
+
+            # Parts upload concurrently; gather keeps results in part order
+            upload_tasks = [
+                asyncio.create_task(upload_indexed_part(index, part_path))
+                for index, part_path in enumerate(parts, start=1)
+            ]
+            try:
+                parts_metadata = await asyncio.gather(*upload_tasks)
+            except BaseException:
+                for task in upload_tasks:
+                    task.cancel()
+                thumbnail_task.cancel()
+                raise
+
+            master_file_id = parts_metadata[0]["file_id"]
+
+            master_thumbnail = await thumbnail_task
 
             metadata = {
                 "parts": parts_metadata,
                 "part_index": 1,
                 "part_total": total_parts,
-                "is_master": True
+                "is_master": True,
+                "quality": str(quality)
             }
 
-            from src.db import get_database
-            from src.link_shortener import create_short_link
             sb = await get_database()
 
             video_data = {
@@ -2029,42 +2408,15 @@ async def web_download(
                 "duration": total_duration,
                 "thumbnail": master_thumbnail,
                 "user_id": user_id,
-                "url": url,
-                "metadata": metadata
-            }
-
-            video_id = None
-            try:
-                result = await sb.table("videos").insert(video_data).execute()
-                if result.data:
-                    video_id = result.data[0].get("id")
-            except Exception as db_error:
-                logger.error("Video metadata insert failed: %s", db_error)
-
-            if video_id is None and master_file_id:
-                try:
-                    lookup = await sb.table("videos").select("id").eq(
-                        "file_id", master_file_id
-                    ).eq("user_id", user_id).order(
-                        "created_at",
-                        desc=True
-                    ).limit(1).execute()
-                    if lookup.data:
-                        video_id = lookup.data[0].get("id")
-                except Exception as lookup_error:
-                    logger.warning(
-                        "Video lookup after insert failed: %s",
-                        lookup_error
-                    )
+                "url": url,
+                "metadata": metadata
+            }
 
-            short_id = await create_short_link(
-                sb,
-                master_file_id,
-                video_id,
-                user_id
-            )
+            video_id, short_id = await save_video_with_short_link(sb, video_data, user_id)
+            background_tasks.add_task(attach_video_to_short_link, sb, short_id, video_id)
 
             logger.info("Upload successful! file_id: %s", master_file_id)
+            invalidate_user_page_cache(user_id)
 
             # Start HLS generation immediately
             try:
@@ -2101,22 +2453,12 @@ async def web_download(
             download_progress[task_id]['status'] = 'completed'
             download_progress[task_id]['progress'] = 100
             download_progress[task_id]['title'] = title
+            finish_download_progress(task_id)
 
-            if downloaded_file and os.path.exists(downloaded_file):
-                os.unlink(downloaded_file)
-            if temp_dir and os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-            for path in parts:
-                if path != downloaded_file and os.path.exists(path):
-                    try:
-                        os.unlink(path)
-                    except OSError:
-                        pass
-            if thumbnail_temp_path and os.path.exists(thumbnail_temp_path):
-                try:
-                    os.unlink(thumbnail_temp_path)
-                except OSError:
-                    pass
+            background_tasks.add_task(
+                _cleanup_paths,
+                [downloaded_file, temp_dir, *parts]
+            )
 
             return {
                 "success": True,
@@ -2128,48 +2470,39 @@ async def web_download(
 
         logger.info(f"Uploading {title} to Telegram...")
 
-        with open(downloaded_file, 'rb') as video_file:
-            if is_audio:
-                message = await bot.send_audio(
-                    chat_id=upload_chat_id,
-                    audio=video_file,
-                    caption=f"🌐 <b>Web Download</b>\n🎵 {title}\n🔗 {url[:100]}...",
-                    parse_mode=ParseMode.HTML,
-                    read_timeout=300,
-                    write_timeout=300
-                )
-                file_id = message.audio.file_id
-                duration = message.audio.duration or 0
-                thumbnail = message.audio.thumbnail.file_id if message.audio.thumbnail else ""
-            else:
-                message = await bot.send_video(
-                    chat_id=upload_chat_id,
-                    video=video_file,
-                    caption=f"🌐 <b>Web Download</b>\n🎬 {title}\n🔗 {url[:100]}...",
-                    parse_mode=ParseMode.HTML,
-                    supports_streaming=True,
-                    read_timeout=300,
-                    write_timeout=300
-                )
-                file_id = message.video.file_id
-                duration = message.video.duration or 0
-                thumbnail = message.video.thumbnail.file_id if message.video.thumbnail else ""
+        video_file = await load_upload_file(downloaded_file)
+        if is_audio:
+            message = await bot.send_audio(
+                chat_id=upload_chat_id,
+                audio=video_file,
+                caption=f"🌐 <b>Web Download</b>\n🎵 {title}\n🔗 {url[:100]}...",
+                parse_mode=ParseMode.HTML,
+                read_timeout=300,
+                write_timeout=300
+            )
+            file_id = message.audio.file_id
+            duration = message.audio.duration or 0
+            thumbnail = message.audio.thumbnail.file_id if message.audio.thumbnail else ""
+        else:
+            message = await bot.send_video(
+                chat_id=upload_chat_id,
+                video=video_file,
+                caption=f"🌐 <b>Web Download</b>\n🎬 {title}\n🔗 {url[:100]}...",
+                parse_mode=ParseMode.HTML,
+                supports_streaming=True,
+                read_timeout=300,
+                write_timeout=300
+            )
+            file_id = message.video.file_id
+            duration = message.video.duration or 0
+            thumbnail = message.video.thumbnail.file_id if message.video.thumbnail else ""
         
         logger.info(f"Upload successful! file_id: {file_id}")
         
-        # Delete downloaded file and temp directory
-        if downloaded_file and os.path.exists(downloaded_file):
-            os.unlink(downloaded_file)
-        if temp_dir and os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        logger.info("Cleaned up temporary files")
-        
-        # Generate short link
-        from src.link_shortener import generate_short_id
-        short_id = generate_short_id()
+        # Delete downloaded file and temp directory after the response is sent
+        background_tasks.add_task(_cleanup_paths, [downloaded_file, temp_dir])
         
         # Save metadata to database
-        from src.db import get_database
         sb = await get_database()
         
         video_data = {
@@ -2178,24 +2511,19 @@ async def web_download(
             "duration": duration,
             "thumbnail": thumbnail,
             "user_id": user_id,
-            "url": url  # Save original URL
+            "url": url,  # Save original URL
+            # Lets later requests reuse this row only at the same quality
+            "metadata": {"quality": str(quality)}
         }
+        if is_audio:
+            # Lets later video requests for the same URL skip this row
+            video_data["metadata"]["is_audio"] = True
         
-        result = await sb.table("videos").insert(video_data).execute()
-        
-        if result.data:
-            video_id = result.data[0]['id']
-            
-            # Create short link
-            await sb.table("shared_links").insert({
-                "short_id": short_id,
-                "file_id": file_id,
-                "video_id": video_id,
-                "user_id": user_id,
-                "views": 0
-            }).execute()
+        video_id, short_id = await save_video_with_short_link(sb, video_data, user_id)
+        background_tasks.add_task(attach_video_to_short_link, sb, short_id, video_id)
         
         logger.info(f"Video metadata saved: video_id={video_id}, short_id={short_id}")
+        invalidate_user_page_cache(user_id)
 
         # Start HLS generation immediately
         try:
@@ -2231,6 +2559,7 @@ async def web_download(
         download_progress[task_id]['status'] = 'completed'
         download_progress[task_id]['progress'] = 100
         download_progress[task_id]['title'] = title
+        finish_download_progress(task_id)
 
         return {
             "success": True,
@@ -2246,18 +2575,10 @@ async def web_download(
         # Update progress to failed
         download_progress[task_id]['status'] = 'failed'
         download_progress[task_id]['error'] = str(e)
+        finish_download_progress(task_id)
 
         # Cleanup on error
-        if downloaded_file and os.path.exists(downloaded_file):
-            try:
-                os.unlink(downloaded_file)
-            except:
-                pass
-        if temp_dir and os.path.exists(temp_dir):
-            try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
+        background_tasks.add_task(_cleanup_paths, [downloaded_file, temp_dir])
 
         return {
             "success": False,
@@ -2724,6 +3045,7 @@ async def files_default_page(request: Request):
 
 @app.post("/api/files/upload")
 async def upload_general_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     user_id: Optional[int] = Form(None)
 ):
@@ -2737,11 +3059,8 @@ async def upload_general_file(
 
         # Async save to temp
         tmp_path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4()}_{file.filename}")
-        async with aiofiles.open(tmp_path, 'wb') as out_file:
-            while content := await file.read(1024 * 1024):  # 1MB chunks
-                await out_file.write(content)
+        file_size = await save_upload_to_disk(file, tmp_path)
 
-        file_size = os.path.getsize(tmp_path)
         parts = [tmp_path]
         
         # Split if needed
@@ -2769,20 +3088,7 @@ async def upload_general_file(
         bin_channel_id = os.getenv("BIN_CHANNEL_ID")
         upload_chat_id = int(bin_channel_id) if bin_channel_id else user_id
         
-        request = HTTPXRequest(connect_timeout=60, read_timeout=600, write_timeout=600)
-        bot = Bot(token=bot_token, request=request)
-
-        async def send_with_retries(send_func, label):
-            last_error = None
-            for attempt in range(1, 4):
-                try:
-                    return await send_func()
-                except Exception as send_error:
-                    last_error = send_error
-                    if attempt < 3:
-                        logger.warning(f"{label} attempt {attempt}/3 failed: {send_error}")
-                        await asyncio.sleep(2 * attempt)
-            raise last_error
+        bot = get_bot()
 
         file_ids = []
         
@@ -2790,10 +3096,10 @@ async def upload_general_file(
             filename_part = file.filename
             if len(parts) > 1:
                 filename_part += f".part{i+1}"
+            caption = f"📁 <b>File Upload</b>\n📄 {file.filename} ({i+1}/{len(parts)})"
                 
             async def upload_task():
                 with open(part_path, "rb") as f:
-                    caption = f"📁 <b>File Upload</b>\n📄 {file.filename} ({i+1}/{len(parts)})"
                     return await bot.send_document(
                         chat_id=upload_chat_id,
                         document=f,
@@ -2807,11 +3113,6 @@ async def upload_general_file(
             msg = await send_with_retries(upload_task, f"upload_part_{i+1}")
             file_ids.append(msg.document.file_id)
 
-        # Cleanup parts
-        for p in parts:
-            if p != tmp_path and os.path.exists(p):
-                os.unlink(p)
-        
         # EPUB Metadata Extraction (before deleting main temp file)
         metadata = {}
         if file.filename.lower().endswith('.epub'):
@@ -2907,12 +3208,11 @@ async def upload_general_file(
 
             # 임시 파일을 영구 위치로 복사
             import shutil
-            shutil.copy2(tmp_path, permanent_path)
+            await asyncio.to_thread(shutil.copy2, tmp_path, permanent_path)
             logger.info(f"📁 Comic saved to: {permanent_path}")
 
-        # Cleanup main temp file
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+        # Delete temporary file(s) after the response is sent
+        background_tasks.add_task(_cleanup_paths, set(parts + [tmp_path]))
 
         # DB Entry
         from src.db import add_file
@@ -2984,10 +3284,10 @@ async def upload_general_file(
 
     except Exception as e:
         logger.error(f"File upload error: {e}")
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.unlink(tmp_path)
-            except: pass
+        paths_to_cleanup = set(locals().get("parts", []))
+        if tmp_path:
+            paths_to_cleanup.add(tmp_path)
+        background_tasks.add_task(_cleanup_paths, paths_to_cleanup)
         return {"success": False, "message": str(e)}
 
 @app.post("/api/files/prepare-download")
@@ -3089,22 +3389,21 @@ async def download_file_by_db_id(file_id: int):
                     tg_file_ids = [p["file_id"] for p in sorted_parts]
                     download_urls = await asyncio.gather(*[get_file_path_from_telegram(fid) for fid in tg_file_ids])
                     
+                    client = get_http_client()
                     async with aiofiles.open(temp_path, 'wb') as outfile:
-                        async with httpx.AsyncClient(timeout=httpx.Timeout(60.0, read=600.0), follow_redirects=True) as client:
-                            for url in download_urls:
-                                async with client.stream("GET", url) as r:
-                                    r.raise_for_status()
-                                    async for chunk in r.aiter_bytes(chunk_size=65536):
-                                        await outfile.write(chunk)
+                        for url in download_urls:
+                            async with client.stream("GET", url) as r:
+                                r.raise_for_status()
+                                async for chunk in r.aiter_bytes(chunk_size=CACHE_FILL_CHUNK_SIZE):
+                                    await outfile.write(chunk)
                 else:
                     tg_file_id = f.get("file_id")
                     download_url = await get_file_path_from_telegram(tg_file_id)
                     async with aiofiles.open(temp_path, 'wb') as outfile:
-                        async with httpx.AsyncClient(timeout=None) as client:
-                            async with client.stream("GET", download_url) as r:
-                                r.raise_for_status()
-                                async for chunk in r.aiter_bytes():
-                                    await outfile.write(chunk)
+                        async with get_http_client().stream("GET", download_url) as r:
+                            r.raise_for_status()
+                            async for chunk in r.aiter_bytes(chunk_size=CACHE_FILL_CHUNK_SIZE):
+                                await outfile.write(chunk)
                 
                 os.rename(temp_path, cache_path)
                 return FileResponse(
@@ -3128,12 +3427,13 @@ async def download_file_by_db_id(file_id: int):
             )
             
             async def iter_concat():
-                async with httpx.AsyncClient(timeout=httpx.Timeout(60.0, read=600.0), follow_redirects=True) as client:
-                    for url in download_urls:
-                        async with client.stream("GET", url) as r:
-                            r.raise_for_status()
-                            async for chunk in r.aiter_bytes(chunk_size=65536):
-                                yield chunk
+                client = get_http_client()
+                for url in download_urls:
+                    async with client.stream("GET", url) as r:
+                        r.raise_for_status()
+                        # Relay chunks as they arrive, like _proxy_stream
+                        async for chunk in r.aiter_bytes():
+                            yield chunk
                                 
             return StreamingResponse(
                 iter_concat(),
@@ -3147,10 +3447,9 @@ async def download_file_by_db_id(file_id: int):
             download_url = await get_file_path_from_telegram(tg_file_id)
             
             async def iter_file():
-                async with httpx.AsyncClient(timeout=None) as client:
-                    async with client.stream("GET", download_url) as r:
-                        async for chunk in r.aiter_bytes():
-                            yield chunk
+                async with get_http_client().stream("GET", download_url) as r:
+                    async for chunk in r.aiter_bytes():
+                        yield chunk
                             
             return StreamingResponse(
                 iter_file(),
@@ -3184,18 +3483,27 @@ async def dashboard_page(request: Request, user_id: int):
     """User dashboard with statistics and quick access"""
     from src.user_manager import get_user_stats
     from src.db import get_database, get_user_videos, get_recent_reading, get_recent_comic_reading
-    from src.link_shortener import get_or_create_short_link
-    
+
     try:
-        # Get user stats
         sb = await get_database()
-        stats = await get_user_stats(sb, user_id)
-        
-        # Get recent videos
-        recent_videos = await get_user_videos(user_id, limit=5)
-        
-        # Get recent reading (EPUB)
-        recent_reading = await get_recent_reading(user_id)
+
+        # Stats and recent videos are cached briefly; reading progress is always fresh
+        cached = dashboard_cache.get(user_id)
+        if cached is not None:
+            stats, formatted_videos = cached
+            recent_reading, recent_comics = await asyncio.gather(
+                get_recent_reading(user_id),
+                get_recent_comic_reading(user_id, limit=5)
+            )
+        else:
+            formatted_videos = None
+            stats, recent_videos, recent_reading, recent_comics = await asyncio.gather(
+                get_user_stats(sb, user_id),
+                get_user_videos(user_id, limit=5),
+                get_recent_reading(user_id),
+                get_recent_comic_reading(user_id, limit=5)
+            )
+
         if recent_reading:
             # Format file info
             file_info = recent_reading.get('files')
@@ -3203,8 +3511,7 @@ async def dashboard_page(request: Request, user_id: int):
                 recent_reading['title'] = file_info.get('file_name', 'Unknown Book')
                 recent_reading['percent_fmt'] = f"{recent_reading.get('percent', 0):.1f}%"
         
-        # Get recent comic reading
-        recent_comics = await get_recent_comic_reading(user_id, limit=5)
+        now = datetime.now(timezone.utc)
         formatted_comics = []
         for rc in recent_comics:
             # Structure: rc['files']['comics'] might be a list or dict
@@ -3229,40 +3536,26 @@ async def dashboard_page(request: Request, user_id: int):
                     'current_page': rc.get('current_page', 0),
                     'total_pages': comic_data.get('page_count', 0),
                     'cover_url': f"/api/comics/thumbnail/{rc.get('file_id')}",
-                    'updated_at': format_date(rc.get('updated_at'))
+                    'updated_at': format_date(rc.get('updated_at'), now)
                 })
         
         # Format videos
-        formatted_videos = []
-        for video in recent_videos:
-            short_id = video.get('short_id', '')
-            if not short_id:
-                file_id = video.get('file_id')
-                if file_id:
-                    try:
-                        short_id = await get_or_create_short_link(
-                            sb,
-                            file_id,
-                            video.get('id'),
-                            user_id
-                        )
-                    except Exception as short_error:
-                        logger.warning(
-                            "Short link lookup failed for file_id=%s: %s",
-                            file_id,
-                            short_error
-                        )
-                        short_id = file_id or ''
-
-            formatted_videos.append({
-                'id': video.get('id'),
-                'short_id': short_id,
-                'title': video.get('title', 'Unknown'),
-                'thumbnail': build_thumbnail_url(video.get('thumbnail', '')),
-                'duration': format_duration(video.get('duration', 0)),
-                'views': video.get('views', 0),
-                'date': format_date(video.get('created_at'))
-            })
+        if formatted_videos is None:
+            short_ids = await resolve_missing_short_ids(sb, recent_videos, user_id)
+            formatted_videos = []
+            for video in recent_videos:
+                short_id = video.get('short_id') or short_ids.get(video.get('file_id'), '')
+
+                formatted_videos.append({
+                    'id': video.get('id'),
+                    'short_id': short_id,
+                    'title': video.get('title', 'Unknown'),
+                    'thumbnail': build_thumbnail_url(video.get('thumbnail', '')),
+                    'duration': format_duration(video.get('duration', 0)),
+                    'views': video.get('views', 0),
+                    'date': format_date(video.get('created_at'), now)
+                })
+            dashboard_cache.set(user_id, (stats, formatted_videos))
         
         return templates.TemplateResponse("dashboard.html", {
             "request": request,
@@ -3299,9 +3592,6 @@ async def search_page(
     sort: str = "latest"
 ):
     """Advanced search page with filters"""
-    from src.db import get_database, search_videos, get_video_by_url
-    from src.link_shortener import get_or_create_short_link
-
     try:
         if not user_id:
             user_id = DEFAULT_USER_ID
@@ -3319,46 +3609,35 @@ async def search_page(
                 )
                 return RedirectResponse(url=f"/watch/{short_id}", status_code=302)
 
-        # Search videos with filters
-        results = await search_videos(
-            user_id=user_id,
-            query=q,
-            date_from=date_from,
-            date_to=date_to,
-            duration_filter=duration,
-            sort_by=sort,
-            limit=100
-        )
-        
-        formatted_results = []
-        for video in results:
-            short_id = video.get('short_id', '')
-            if not short_id:
-                file_id = video.get('file_id')
-                if file_id:
-                    try:
-                        short_id = await get_or_create_short_link(
-                            sb,
-                            file_id,
-                            video.get('id'),
-                            user_id
-                        )
-                    except Exception as short_error:
-                        logger.warning(
-                            "Short link lookup failed for file_id=%s: %s",
-                            file_id,
-                            short_error
-                        )
-                        short_id = file_id or ''
-            formatted_results.append({
-                'id': video.get('id'),
-                'short_id': short_id,
-                'title': video.get('title', 'Unknown'),
-                'thumbnail': build_thumbnail_url(video.get('thumbnail', '')),
-                'duration_formatted': format_duration(video.get('duration', 0)),
-                'views': video.get('views', 0),
-                'date': format_date(video.get('created_at'))
-            })
+        cache_key = (user_id, q, date_from, date_to, duration, sort)
+        formatted_results = search_cache.get(cache_key)
+        if formatted_results is None:
+            # Search videos with filters
+            results = await search_videos(
+                user_id=user_id,
+                query=q,
+                date_from=date_from,
+                date_to=date_to,
+                duration_filter=duration,
+                sort_by=sort,
+                limit=100
+            )
+            short_ids = await resolve_missing_short_ids(sb, results, user_id)
+
+            now = datetime.now(timezone.utc)
+            formatted_results = []
+            for video in results:
+                short_id = video.get('short_id') or short_ids.get(video.get('file_id'), '')
+                formatted_results.append({
+                    'id': video.get('id'),
+                    'short_id': short_id,
+                    'title': video.get('title', 'Unknown'),
+                    'thumbnail': build_thumbnail_url(video.get('thumbnail', '')),
+                    'duration_formatted': format_duration(video.get('duration', 0)),
+                    'views': video.get('views', 0),
+                    'date': format_date(video.get('created_at'), now)
+                })
+            search_cache.set(cache_key, formatted_results)
         
         return templates.TemplateResponse("search.html", {
             "request": request,
@@ -3379,11 +3658,20 @@ async def search_page(
 # Phase 3: File Upload Feature
 @app.post("/api/upload-file")
 async def upload_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     user_id: Optional[int] = Form(None)
 ):
     """Upload local video file to Telegram with enhanced stability"""
     tmp_path = None
+    thumbnail_task = None
+    thumbnail_upload_task = None
+
+    def cancel_thumbnail_tasks():
+        # A failed upload must not keep reading tmp_path or post an orphan photo
+        for task in (thumbnail_task, thumbnail_upload_task):
+            if task is not None:
+                task.cancel()
 
     try:
         if not user_id:
@@ -3393,15 +3681,20 @@ async def upload_file(
 
         # Async save to temp
         tmp_path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4()}_{file.filename}")
-        async with aiofiles.open(tmp_path, 'wb') as out_file:
-            while content := await file.read(1024 * 1024):  # 1MB chunks
-                await out_file.write(content)
+        file_size = await save_upload_to_disk(file, tmp_path)
 
         logger.info("Temporary file saved: %s", tmp_path)
 
+        needs_split = file_size > MAX_WEB_UPLOAD_SIZE
+        if needs_split and (not FFMPEG_PATH or not FFPROBE_PATH):
+            raise Exception(
+                "FFmpeg/ffprobe not found. Install FFmpeg and ensure "
+                "ffmpeg/ffprobe are available in PATH."
+            )
+
+        # Probed once here; the thumbnail seek and the splitter both reuse it
         total_duration = 0
         try:
-            from src.splitter import get_video_duration
             total_duration = await get_video_duration(tmp_path)
         except Exception as duration_error:
             logger.warning(
@@ -3410,25 +3703,10 @@ async def upload_file(
                 duration_error
             )
 
-        file_size = os.path.getsize(tmp_path)
-        if file_size > MAX_WEB_UPLOAD_SIZE:
-            if not shutil.which("ffmpeg") or not shutil.which("ffprobe"):
-                raise Exception(
-                    "FFmpeg/ffprobe not found. Install FFmpeg and ensure "
-                    "ffmpeg/ffprobe are available in PATH."
-                )
-            logger.info(
-                "File exceeds limit (%.1fMB), splitting into parts.",
-                file_size / (1024 * 1024)
-            )
-            from src.splitter import split_video
-            parts = await split_video(
-                tmp_path,
-                MAX_WEB_UPLOAD_SIZE,
-                transcode=False
-            )
-        else:
-            parts = [tmp_path]
+        # Thumbnail extraction and splitting read the same input; run them together
+        thumbnail_task = asyncio.create_task(
+            extract_thumbnail_jpeg(tmp_path, total_duration)
+        )
 
         # Get Telegram credentials
         bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -3448,114 +3726,32 @@ async def upload_file(
             logger.info("BIN_CHANNEL_ID not set; uploading to user_id=%s", user_id)
 
         # Upload to Telegram
-        from telegram import Bot
         from telegram.constants import ParseMode
-        from telegram.request import HTTPXRequest
-
-        request = HTTPXRequest(
-            connect_timeout=60,
-            read_timeout=600,
-            write_timeout=600,
-            pool_timeout=60
-        )
-        bot = Bot(token=bot_token, request=request)
 
-        async def send_with_retries(send_func, label):
-            last_error = None
-            for attempt in range(1, 4):
-                try:
-                    return await send_func()
-                except Exception as send_error:
-                    last_error = send_error
-                    if attempt < 3:
-                        logger.warning(
-                            "%s attempt %s/3 failed: %s",
-                            label,
-                            attempt,
-                            send_error
-                        )
-                        await asyncio.sleep(2 * attempt)
-            raise last_error
+        bot = get_bot()
 
-        async def create_thumbnail_file(source_path: str, duration_hint: float) -> str:
-            if not shutil.which("ffmpeg"):
+        async def upload_thumbnail(image_bytes: bytes) -> str:
+            if not image_bytes:
                 return ""
-
-            if duration_hint and duration_hint > 2:
-                thumb_time = min(max(duration_hint * 0.1, 1), duration_hint - 1)
-            else:
-                thumb_time = 1
-
-            tmp_thumb = tempfile.NamedTemporaryFile(
-                delete=False,
-                suffix=".jpg"
+            message = await send_with_retries(
+                lambda: bot.send_photo(
+                    chat_id=upload_chat_id,
+                    photo=image_bytes,
+                    caption="🖼️ Thumbnail"
+                ),
+                "send_photo"
             )
-            tmp_thumb.close()
-
-            cmd = [
-                "ffmpeg",
-                "-y",
-                "-ss", str(thumb_time),
-                "-i", source_path,
-                "-frames:v", "1",
-                "-q:v", "2",
-                tmp_thumb.name
-            ]
-
-            try:
-                process = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                stdout, stderr = await process.communicate()
-                returncode = process.returncode
-            except NotImplementedError:
-                result = await asyncio.to_thread(
-                    subprocess.run,
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
-                stdout = result.stdout
-                stderr = result.stderr
-                returncode = result.returncode
-
-            if returncode != 0:
-                error_msg = stderr.decode(errors="replace")
-                logger.warning("Thumbnail generation failed: %s", error_msg)
-                try:
-                    os.unlink(tmp_thumb.name)
-                except OSError:
-                    pass
-                return ""
-
-            return tmp_thumb.name
-
-        async def upload_thumbnail(path: str) -> str:
-            if not path:
-                return ""
-            with open(path, "rb") as image_file:
-                message = await send_with_retries(
-                    lambda: bot.send_photo(
-                        chat_id=upload_chat_id,
-                        photo=image_file,
-                        caption="🖼️ Thumbnail"
-                    ),
-                    "send_photo"
-                )
             if message.photo:
                 return message.photo[-1].file_id
             return ""
 
         async def send_document(path, caption):
-            with open(path, "rb") as video_file:
-                return await bot.send_document(
-                    chat_id=upload_chat_id,
-                    document=video_file,
-                    caption=caption,
-                    parse_mode=ParseMode.HTML
-                )
+            return await bot.send_document(
+                chat_id=upload_chat_id,
+                document=await load_upload_file(path),
+                caption=caption,
+                parse_mode=ParseMode.HTML
+            )
 
         async def upload_part(path, part_label):
             caption = (
@@ -3563,16 +3759,14 @@ async def upload_file(
             )
             
             async def upload_task():
-                with open(path, "rb") as f:
-                    msg = await bot.send_document(
-                        chat_id=upload_chat_id,
-                        document=f,
-                        caption=caption,
-                        parse_mode=ParseMode.HTML,
-                        read_timeout=300,
-                        write_timeout=300
-                    )
-                    return msg
+                return await bot.send_document(
+                    chat_id=upload_chat_id,
+                    document=await load_upload_file(path),
+                    caption=caption,
+                    parse_mode=ParseMode.HTML,
+                    read_timeout=300,
+                    write_timeout=300
+                )
 
             message = await send_with_retries(upload_task, "send_document")
             
@@ -3588,55 +3782,84 @@ async def upload_file(
             raise Exception("Telegram upload failed (no document/video in response)")
 
         # Save metadata to database (single master record)
-        from src.db import get_database
-        from src.link_shortener import create_short_link
         sb = await get_database()
 
-        total_parts = len(parts)
         parts_metadata = []
         master_file_id = None
-        master_thumbnail = ""
-        thumbnail_temp_path = ""
 
-        try:
-            thumbnail_temp_path = await create_thumbnail_file(
-                tmp_path,
-                total_duration
+        async def upload_extracted_thumbnail() -> str:
+            try:
+                thumbnail_bytes = await thumbnail_task
+                if thumbnail_bytes:
+                    return await upload_thumbnail(thumbnail_bytes)
+            except Exception as thumb_error:
+                logger.warning("Thumbnail upload failed: %s", thumb_error)
+            return ""
+
+        thumbnail_upload_task = asyncio.create_task(upload_extracted_thumbnail())
+
+        filename_path = Path(file.filename)
+        filename_stem, filename_suffix = filename_path.stem, filename_path.suffix
+
+        def part_title_for(index, total):
+            if total == 1:
+                return file.filename
+            return f"{filename_stem} (Part {index}/{total}){filename_suffix}"
+
+        if needs_split:
+            logger.info(
+                "File exceeds limit (%.1fMB), splitting into parts.",
+                file_size / (1024 * 1024)
             )
-            if thumbnail_temp_path:
-                master_thumbnail = await upload_thumbnail(thumbnail_temp_path)
-        except Exception as thumb_error:
-            logger.warning("Thumbnail upload failed: %s", thumb_error)
-
-        for index, part_path in enumerate(parts, start=1):
-            if total_parts == 1:
-                part_title = file.filename
-            else:
-                part_title = (
-                    f"{Path(file.filename).stem} (Part {index}/{total_parts})"
-                    f"{Path(file.filename).suffix}"
-                )
+        # Captions use the planned count; an oversized part that gets re-split adds parts
+        planned_parts = planned_part_count(file_size, MAX_WEB_UPLOAD_SIZE)
+        upload_semaphore = asyncio.Semaphore(TELEGRAM_UPLOAD_CONCURRENCY)
 
-            try:
-                part_size = os.path.getsize(part_path)
-                logger.info(
-                    "Uploading %s to Telegram chat_id=%s (%.1fMB)...",
-                    part_title,
-                    upload_chat_id,
-                    part_size / (1024 * 1024)
-                )
-            except OSError:
-                logger.info(
-                    "Uploading %s to Telegram chat_id=%s...",
-                    part_title,
-                    upload_chat_id
+        async def upload_indexed_part(index, part_path):
+            part_title = part_title_for(index, planned_parts)
+
+            async with upload_semaphore:
+                try:
+                    part_size = os.path.getsize(part_path)
+                    logger.info(
+                        "Uploading %s to Telegram chat_id=%s (%.1fMB)...",
+                        part_title,
+                        upload_chat_id,
+                        part_size / (1024 * 1024)
+                    )
+                except OSError:
+                    logger.info(
+                        "Uploading %s to Telegram chat_id=%s...",
+                        part_title,
+                        upload_chat_id
+                    )
+
+                return await upload_part(part_path, part_title)
+
+        # Upload each part as soon as the splitter has written it; gather keeps
+        # results in part order
+        parts = []
+        upload_tasks = []
+        try:
+            async for part_path in iter_split_video(
+                tmp_path, MAX_WEB_UPLOAD_SIZE, transcode=False, duration=total_duration
+            ):
+                parts.append(part_path)
+                upload_tasks.append(
+                    asyncio.create_task(upload_indexed_part(len(parts), part_path))
                 )
+            uploaded_parts = await asyncio.gather(*upload_tasks)
+        except BaseException:
+            for task in upload_tasks:
+                task.cancel()
+            cancel_thumbnail_tasks()
+            raise
 
-            file_id, duration, thumbnail = await upload_part(
-                part_path,
-                part_title
-            )
+        total_parts = len(parts)
+        master_thumbnail = await thumbnail_upload_task
 
+        for index, (file_id, duration, thumbnail) in enumerate(uploaded_parts, start=1):
+            part_title = part_title_for(index, total_parts)
             if master_file_id is None:
                 master_file_id = file_id
                 if not master_thumbnail and thumbnail:
@@ -3672,40 +3895,13 @@ async def upload_file(
         if metadata:
             video_data["metadata"] = metadata
 
-        video_id = None
-        try:
-            result = await sb.table("videos").insert(video_data).execute()
-            if result.data:
-                video_id = result.data[0].get("id")
-            else:
-                logger.warning("Video insert returned no data: %s", result)
-        except Exception as db_error:
-            logger.error("Video metadata insert failed: %s", db_error)
-
-        if video_id is None and master_file_id:
-            try:
-                lookup = await sb.table("videos").select("id").eq(
-                    "file_id", master_file_id
-                ).eq("user_id", user_id).order(
-                    "created_at",
-                    desc=True
-                ).limit(1).execute()
-                if lookup.data:
-                    video_id = lookup.data[0].get("id")
-            except Exception as lookup_error:
-                logger.warning(
-                    "Video lookup after insert failed: %s",
-                    lookup_error
-                )
-
-        short_id = await create_short_link(
-            sb,
-            master_file_id,
-            video_id,
-            user_id
-        )
+        # The inserted row comes back in the response; a guessed lookup by
+        # file_id/user_id could pick another concurrent upload's row
+        video_id, short_id = await save_video_with_short_link(sb, video_data, user_id)
+        background_tasks.add_task(attach_video_to_short_link, sb, short_id, video_id)
 
         logger.info("Upload successful! parts=%s", total_parts)
+        invalidate_user_page_cache(user_id)
 
         # Start HLS generation immediately
         try:
@@ -3737,16 +3933,8 @@ async def upload_file(
         else:
             logger.warning("⚠️ DEFAULT_USER_ID is not set, skipping notification")
 
-        # Delete temporary file(s) immediately
-        cleanup_paths = set(parts + [tmp_path])
-        if thumbnail_temp_path:
-            cleanup_paths.add(thumbnail_temp_path)
-        for path in cleanup_paths:
-            if path and os.path.exists(path):
-                try:
-                    os.unlink(path)
-                    logger.info("Temporary file deleted: %s", path)
-                except: pass
+        # Delete temporary file(s) after the response is sent
+        background_tasks.add_task(_cleanup_paths, set(parts + [tmp_path]))
 
         message = "✅ Uploaded to Telegram successfully!"
 
@@ -3760,24 +3948,16 @@ async def upload_file(
 
     except Exception as e:
         logger.error("File upload error (%s): %r", type(e).__name__, e)
+        cancel_thumbnail_tasks()
 
         # Cleanup temporary file on error
         paths_to_cleanup = set()
         if tmp_path:
             paths_to_cleanup.add(tmp_path)
-        if locals().get("thumbnail_temp_path"):
-            paths_to_cleanup.add(locals().get("thumbnail_temp_path"))
         for path in locals().get("parts", []):
             if path:
                 paths_to_cleanup.add(path)
-
-        for path in paths_to_cleanup:
-            if os.path.exists(path):
-                try:
-                    os.unlink(path)
-                    logger.info("Cleaned up temporary file after error: %s", path)
-                except Exception as cleanup_error:
-                    logger.error("Failed to cleanup temp file: %s", cleanup_error)
+        background_tasks.add_task(_cleanup_paths, paths_to_cleanup)
 
         message = str(e) or "Upload failed due to an unexpected error."
         return {
@@ -3794,8 +3974,6 @@ async def reencode_video(
     resolution: str = Body("720p")
 ):
     """Trigger video re-encoding for mobile compatibility"""
-    from src.db import get_video_by_short_id, get_database
-    
     try:
         logger.info(f"🔄 Re-encode request received for {short_id} (User: {user_id}, Res: {resolution})")
         
@@ -3818,6 +3996,9 @@ async def reencode_video(
             # But `templates/watch.html` disables the button if `is_encoded`.
             # So this check is fine for the current flow (first time optimization).
             return {"success": True, "message": "Already encoded", "already_exists": True}
+
+        if is_transcoding(video["id"]):
+            return {"success": True, "message": "Re-encoding already in progress"}
             
         # Start background task
         sb = await get_database()
@@ -3851,8 +4032,6 @@ async def reencode_video(
 @app.get("/stream/encoded/{short_id}")
 async def stream_encoded_video(short_id: str, request: Request):
     """Stream re-encoded MP4 file with Range support"""
-    from src.db import get_video_by_short_id
-    
     try:
         video = await get_video_by_short_id(short_id)
         if not video:
@@ -3861,13 +4040,23 @@ async def stream_encoded_video(short_id: str, request: Request):
         metadata = video.get("metadata") or {}
         encoded_path = metadata.get("encoded_path")
         
-        if not encoded_path or not os.path.exists(encoded_path):
+        # One stat serves the existence check, the validators and FileResponse
+        try:
+            stat_result = os.stat(encoded_path) if encoded_path else None
+        except OSError:
+            stat_result = None
+        if stat_result is None:
             raise HTTPException(status_code=404, detail="Encoded file not found")
+
+        etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers={"ETag": etag})
             
         return FileResponse(
             path=encoded_path,
             media_type="video/mp4",
-            headers={"Accept-Ranges": "bytes"}
+            stat_result=stat_result,
+            headers={"Accept-Ranges": "bytes", "ETag": etag}
         )
         
     except HTTPException:
@@ -3881,8 +4070,6 @@ async def stream_encoded_video(short_id: str, request: Request):
 @app.get("/edit/{video_id}", response_class=HTMLResponse)
 async def edit_page(request: Request, video_id: int, user_id: Optional[int] = None):
     """Video editing page"""
-    from src.db import get_video_by_id
-    
     try:
         if not user_id:
             user_id = DEFAULT_USER_ID
@@ -3920,8 +4107,6 @@ async def update_video(
     user_id: int = Body(...)
 ):
     """Update video metadata"""
-    from src.db import update_video_metadata
-    
     try:
         success = await update_video_metadata(
             video_id=video_id,
@@ -3930,6 +4115,8 @@ async def update_video(
             description=description,
             tags=tags
         )
+        if success:
+            invalidate_user_page_cache(user_id)
         
         return {"success": success}
     except Exception as e:
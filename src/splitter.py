@@ -99,6 +99,10 @@ async def get_video_stream_metadata(file_path: str) -> dict:
         "rotate": tags.get("rotate")
     }
 
+def planned_part_count(file_size: int, max_size_bytes: int) -> int:
+    """Number of parts split_video will cut a file of file_size into (before any re-splits)."""
+    return max(1, math.ceil(file_size / max_size_bytes))
+
 async def split_video(
     file_path: str,
     max_size_bytes: int = 2 * 1024 * 1024 * 1024,
@@ -109,23 +113,38 @@ async def split_video(
     Returns list of file paths (including original if no split needed).
     If transcode=True, re-encode while preserving display aspect ratio metadata.
     """
+    return [part async for part in iter_split_video(file_path, max_size_bytes, transcode)]
+
+async def iter_split_video(
+    file_path: str,
+    max_size_bytes: int = 2 * 1024 * 1024 * 1024,
+    transcode: bool = False,
+    duration: float = 0.0
+):
+    """
+    Async generator version of split_video.
+    Yields each part path as soon as ffmpeg has finished writing it, so callers
+    can start uploading early parts while later ones are still being cut.
+    Pass duration when the caller has already probed file_path.
+    """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
         
     current_size = os.path.getsize(file_path)
     
     if current_size <= max_size_bytes:
-        return [file_path]
+        yield file_path
+        return
     
     # Calculate number of parts and duration per part
-    duration = await get_video_duration(file_path)
-    num_parts = math.ceil(current_size / max_size_bytes)
+    if not duration:
+        duration = await get_video_duration(file_path)
+    num_parts = planned_part_count(current_size, max_size_bytes)
     part_duration = duration / num_parts
     stream_meta = {}
     if transcode:
         stream_meta = await get_video_stream_metadata(file_path)
     
-    output_parts = []
     base_name, ext = os.path.splitext(file_path)
     
     for i in range(num_parts):
@@ -256,28 +275,26 @@ async def split_video(
             raise Exception(f"ffmpeg split failed: {error_msg}")
             
         logging.info(f"Split part {i+1} completed.")
-            
-        output_parts.append(output_name)
-        
-    final_parts = []
-    for part_path in output_parts:
+
         try:
-            part_size = os.path.getsize(part_path)
+            part_size = os.path.getsize(output_name)
         except OSError:
-            final_parts.append(part_path)
+            yield output_name
             continue
 
         if part_size <= max_size_bytes:
-            final_parts.append(part_path)
+            yield output_name
             continue
 
         # If a part still exceeds size, split again without re-encoding.
-        sub_parts = await split_video(part_path, max_size_bytes, transcode=False)
-        if sub_parts != [part_path] and os.path.exists(part_path):
+        # The oversized part is the input for its sub-parts, so it is only
+        # removed once all of them have been produced.
+        re_split = False
+        async for sub_part in iter_split_video(output_name, max_size_bytes, transcode=False):
+            re_split = re_split or sub_part != output_name
+            yield sub_part
+        if re_split and os.path.exists(output_name):
             try:
-                os.remove(part_path)
+                os.remove(output_name)
             except OSError:
                 pass
-        final_parts.extend(sub_parts)
-
-    return final_parts
@@ -1,7 +1,6 @@
 import asyncio
 import os
 import logging
-import subprocess
 import tempfile
 import shutil
 import httpx
@@ -12,6 +11,9 @@ from telegram import Bot
 from telegram.request import HTTPXRequest
 from telegram.constants import ParseMode
 from src.subtitle_manager import find_subtitle_files
+from src.db import forget_cached_video
+from src.work_dir import get_work_dir
+from src.file_manager import PART_DOWNLOAD_CONCURRENCY, download_file, get_telegram_file_url
 
 # Logger setup
 logger = logging.getLogger(__name__)
@@ -21,31 +23,16 @@ ENCODED_CACHE_DIR = Path("encoded_cache")
 ENCODED_CACHE_DIR.mkdir(exist_ok=True)
 
 # Constants
-CHUNK_SIZE = 64 * 1024  # 64KB
+TRANSCODE_CONCURRENCY = 2  # ffmpeg encodes running at once per process
+FFMPEG_PATH = shutil.which("ffmpeg")  # Resolved once, not per task
 
-async def download_file(client, url, dest_path):
-    """Download a single file from a URL."""
-    try:
-        async with client.stream("GET", url) as r:
-            r.raise_for_status()
-            with open(dest_path, "wb") as f:
-                async for chunk in r.aiter_bytes(chunk_size=CHUNK_SIZE):
-                    f.write(chunk)
-        return True
-    except Exception as e:
-        logger.error(f"Download failed for {url}: {e}")
-        return False
-
-async def get_telegram_file_url(bot_token, file_id):
-    """Get the download URL for a Telegram file ID."""
-    url = f"https://api.telegram.org/bot{bot_token}/getFile?file_id={file_id}"
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url)
-        data = resp.json()
-        if not data.get("ok"):
-            raise Exception(f"Telegram getFile failed: {data}")
-        file_path = data["result"]["file_path"]
-        return f"https://api.telegram.org/file/bot{bot_token}/{file_path}"
+_transcode_semaphore = asyncio.Semaphore(TRANSCODE_CONCURRENCY)
+# Videos with a transcode in flight; repeat requests for them are dropped
+_active_transcodes: set[int] = set()
+
+def is_transcoding(video_id: int) -> bool:
+    """Whether a transcode for this video is currently running."""
+    return video_id in _active_transcodes
 
 async def transcode_video_task(
     video_id: int,
@@ -59,14 +46,20 @@ async def transcode_video_task(
     """
     Background task to download, concat (if needed), and transcode video.
     """
+    # Double clicks and retries must not download and encode the same video twice
+    if video_id in _active_transcodes:
+        logger.info(f"⏭️ Transcoding already running for video {video_id}, skipping duplicate request")
+        return
+
     logger.info(f"🚀 Starting transcoding task for video {video_id} (User: {user_id}, Res: {resolution})")
     
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = tempfile.mkdtemp(dir=get_work_dir())
     input_path = os.path.join(temp_dir, "input.mp4")
     temp_output_path = os.path.join(temp_dir, "encoded.mp4")
     final_output_filename = f"{short_id}_mobile.mp4"
     final_output_path = ENCODED_CACHE_DIR / final_output_filename
 
+    _active_transcodes.add(video_id)
     try:
         # 1. Fetch Video Metadata
         resp = await db_client.table("videos").select("*").eq("id", video_id).single().execute()
@@ -83,53 +76,52 @@ async def transcode_video_task(
             if parts and len(parts) > 1:
                 # Multi-part video: Download all parts and concat
                 logger.info(f"📥 Downloading {len(parts)} parts for concatenation...")
-                part_files = []
-                sorted_parts = sorted(parts, key=lambda x: x.get("part", 0))
-                
-                for idx, part in enumerate(sorted_parts):
-                    fid = part.get("file_id")
-                    if not fid: continue
-                    
-                    file_url = await get_telegram_file_url(bot_token, fid)
-                    part_path = os.path.join(temp_dir, f"part_{idx}.mp4")
-                    
-                    success = await download_file(client, file_url, part_path)
-                    if not success:
-                        raise Exception(f"Failed to download part {idx+1}")
-                    part_files.append(part_path)
-
-                # Create concat list
+                sorted_parts = [
+                    part for part in sorted(parts, key=lambda x: x.get("part", 0))
+                    if part.get("file_id")
+                ]
+                # Paths are fixed up front so concat order doesn't depend on finish order
+                part_files = [
+                    os.path.join(temp_dir, f"part_{idx}.mp4") for idx in range(len(sorted_parts))
+                ]
+                semaphore = asyncio.Semaphore(PART_DOWNLOAD_CONCURRENCY)
+
+                async def fetch_part(idx, part):
+                    async with semaphore:
+                        file_url = await get_telegram_file_url(bot_token, part["file_id"], client)
+                        success = await download_file(client, file_url, part_files[idx])
+                        if not success:
+                            raise Exception(f"Failed to download part {idx+1}")
+
+                tasks = [
+                    asyncio.create_task(fetch_part(idx, part))
+                    for idx, part in enumerate(sorted_parts)
+                ]
+                try:
+                    await asyncio.gather(*tasks)
+                except BaseException:
+                    for task in tasks:
+                        task.cancel()
+                    raise
+
+                # The encoder reads the parts through the concat demuxer, so no
+                # joined copy of the whole video is written to disk first
                 concat_list_path = os.path.join(temp_dir, "concat.txt")
                 with open(concat_list_path, "w", encoding="utf-8") as f:
-                    for pf in part_files:
-                        f.write(f"file '{pf}'\n")
-
-                # Concat using FFmpeg (copy codec to create single input file)
-                logger.info("🔗 Concatenating parts...")
-                concat_cmd = [
-                    "ffmpeg", "-f", "concat", "-safe", "0",
-                    "-i", concat_list_path, "-c", "copy", input_path
-                ]
-                
-                # Use asyncio.to_thread to avoid blocking event loop
-                concat_result = await asyncio.to_thread(
-                    subprocess.run, 
-                    concat_cmd, 
-                    check=False, 
-                    capture_output=True
-                )
-                
-                if concat_result.returncode != 0:
-                     raise Exception(f"Concatenation failed: {concat_result.stderr.decode(errors='replace')}")
+                    f.write("".join(f"file '{pf}'\n" for pf in part_files))
+                source_input = ["-f", "concat", "-safe", "0", "-i", concat_list_path]
+                source_paths = part_files
                 
             else:
                 # Single file
                 logger.info("📥 Downloading single video file...")
                 file_id = video.get("file_id")
-                file_url = await get_telegram_file_url(bot_token, file_id)
+                file_url = await get_telegram_file_url(bot_token, file_id, client)
                 success = await download_file(client, file_url, input_path)
                 if not success:
                     raise Exception("Failed to download video file")
+                source_input = ["-i", input_path]
+                source_paths = [input_path]
 
         # 3. Download Subtitles (if any)
         subtitle_path = None
@@ -154,26 +146,24 @@ async def transcode_video_task(
         # 4. Transcode (Re-encode)
         logger.info(f"⚙️ Transcoding to H.264/AAC ({resolution}, faststart)...")
         
-        # Verify input file
-        if os.path.exists(input_path):
-            input_size = os.path.getsize(input_path)
-            logger.info(f"   Input file size: {input_size} bytes")
-            if input_size == 0:
-                raise Exception("Input file is empty")
-        else:
+        # Verify input file(s)
+        missing = [path for path in source_paths if not os.path.exists(path)]
+        if missing:
             raise Exception("Input file not found")
+        input_size = sum(os.path.getsize(path) for path in source_paths)
+        logger.info(f"   Input file size: {input_size} bytes")
+        if input_size == 0:
+            raise Exception("Input file is empty")
 
-        # Resolve ffmpeg path
-        ffmpeg_exe = shutil.which("ffmpeg")
-        if not ffmpeg_exe:
+        if not FFMPEG_PATH:
             raise Exception("FFmpeg executable not found in PATH")
 
         # Prepare FFmpeg command based on resolution
         # -crf 26: Reasonable quality/size trade-off for mobile
         # -preset veryfast: Faster encoding
         transcode_cmd = [
-            ffmpeg_exe, "-y",
-            "-i", input_path
+            FFMPEG_PATH, "-y",
+            *source_input
         ]
 
         if subtitle_path:
@@ -212,35 +202,38 @@ async def transcode_video_task(
         
         logger.info(f"   Command: {' '.join(transcode_cmd)}")
 
-        # Use create_subprocess_exec to monitor progress
-        process = await asyncio.create_subprocess_exec(
-            *transcode_cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
+        # Encodes are CPU-bound; queued tasks wait for a slot instead of
+        # all running ffmpeg at once
+        async with _transcode_semaphore:
+            # Use create_subprocess_exec to monitor progress
+            process = await asyncio.create_subprocess_exec(
+                *transcode_cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
 
-        # Read stderr to log progress
-        last_log_time = time.time()
-        error_lines = []
+            # Read stderr to log progress
+            last_log_time = time.time()
+            error_lines = []
         
-        while True:
-            line = await process.stderr.readline()
-            if not line:
-                break
+            while True:
+                line = await process.stderr.readline()
+                if not line:
+                    break
             
-            line_str = line.decode('utf-8', errors='replace').strip()
-            error_lines.append(line_str)
+                line_str = line.decode('utf-8', errors='replace').strip()
+                error_lines.append(line_str)
             
-            # Keep error lines buffer small
-            if len(error_lines) > 50:
-                error_lines.pop(0)
+                # Keep error lines buffer small
+                if len(error_lines) > 50:
+                    error_lines.pop(0)
 
-            # Log progress every 10 seconds
-            if 'time=' in line_str and (time.time() - last_log_time > 10):
-                logger.info(f"   Encoding progress: {line_str}")
-                last_log_time = time.time()
+                # Log progress every 10 seconds
+                if 'time=' in line_str and (time.time() - last_log_time > 10):
+                    logger.info(f"   Encoding progress: {line_str}")
+                    last_log_time = time.time()
 
-        await process.wait()
+            await process.wait()
 
         logger.info(f"   FFmpeg return code: {process.returncode}")
         
@@ -250,7 +243,8 @@ async def transcode_video_task(
             raise Exception(f"Transcoding failed with code {process.returncode}")
         # 4. Move to Cache
         if os.path.exists(temp_output_path):
-            shutil.move(temp_output_path, final_output_path)
+            # The temp dir may sit on another filesystem, making this a full copy
+            await asyncio.to_thread(shutil.move, temp_output_path, final_output_path)
             logger.info(f"✅ Encoded file saved to {final_output_path}")
         else:
             raise Exception("Output file not found after transcoding")
@@ -261,6 +255,7 @@ async def transcode_video_task(
         metadata["last_played"] = datetime.now().isoformat()
         
         await db_client.table("videos").update({"metadata": metadata}).eq("id", video_id).execute()
+        forget_cached_video(video_id)
 
         # 6. Notify User
         if user_id:
@@ -288,9 +283,10 @@ async def transcode_video_task(
         logger.error(f"❌ Transcoding task failed: {repr(e)}")
         # Clean up partial files if any? (Optional)
     finally:
+        _active_transcodes.discard(video_id)
         # Cleanup temp dir
         if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            await asyncio.to_thread(shutil.rmtree, temp_dir, ignore_errors=True)
             logger.info("🧹 Temp directory cleaned up")
 
 async def cleanup_old_encoded_files(db_client):
@@ -321,6 +317,7 @@ async def cleanup_old_encoded_files(db_client):
                         del metadata["encoded_path"]
                         metadata["is_encoded"] = False
                         await db_client.table("videos").update({"metadata": metadata}).eq("id", row["id"]).execute()
+                        forget_cached_video(row["id"])
                         count += 1
         
         logger.info(f"✅ Cleanup finished. Removed {count} files.")
@@ -0,0 +1,30 @@
+"""
+Scratch directory shared by web downloads, file preparation and transcodes.
+"""
+import os
+import logging
+import tempfile
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Point DL_WORKDIR at a tmpfs (e.g. /dev/shm/tgvidbot) to keep yt-dlp/ffmpeg
+# I/O in RAM when the host has room for the largest expected download.
+DEFAULT_WORK_DIR = os.path.join(tempfile.gettempdir(), "tgvidbot")
+
+
+@lru_cache(maxsize=None)
+def get_work_dir() -> str:
+    """
+    Resolve and create the scratch root once per process.
+
+    Falls back to the system temp dir when DL_WORKDIR cannot be created, so a
+    bad setting degrades to disk I/O instead of breaking imports or tasks.
+    """
+    work_dir = os.getenv("DL_WORKDIR") or DEFAULT_WORK_DIR
+    try:
+        os.makedirs(work_dir, exist_ok=True)
+    except OSError as e:
+        logger.error(f"❌ Cannot create work dir {work_dir}: {e}; using {tempfile.gettempdir()}")
+        return tempfile.gettempdir()
+    return work_dir
@@ -0,0 +1,13 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from src.server import app
+
+
+def test_protected_api_rejects_missing_or_wrong_key_when_configured():
+    client = TestClient(app)
+
+    with patch.dict("os.environ", {"API_KEY": "secret"}):
+        assert client.get("/api/stats/42").status_code == 401
+        assert client.get("/api/stats/42", headers={"X-API-Key": "wrong"}).status_code == 403
@@ -60,4 +60,135 @@ async def test_crud_operations():
         mock_execute.data = [{"file_id": "file_123"}]
         result = await get_video_by_file_id("file_123")
         mock_select.eq.assert_called_with("file_id", "file_123")
-        assert result["file_id"] == "file_123"
\ No newline at end of file
+        assert result["file_id"] == "file_123"
+
+@pytest.mark.asyncio
+async def test_get_video_by_short_id_caches_and_collapses_concurrent_misses():
+    import asyncio
+    import src.db as db
+
+    db._video_by_short_id_cache.clear()
+
+    async def slow_fetch(short_id):
+        await asyncio.sleep(0.01)
+        return {"id": 7, "short_id": short_id, "title": "Cached"}
+
+    with patch("src.db._fetch_video_by_short_id", side_effect=slow_fetch) as mock_fetch:
+        results = await asyncio.gather(*[db.get_video_by_short_id("abc12345") for _ in range(5)])
+        assert all(r["title"] == "Cached" for r in results)
+        assert mock_fetch.call_count == 1
+
+        cached = await db.get_video_by_short_id("abc12345")
+        assert mock_fetch.call_count == 1
+
+        # Callers get copies; mutating one must not leak into the cache
+        cached["title"] = "Edited"
+        assert (await db.get_video_by_short_id("abc12345"))["title"] == "Cached"
+
+        # Edits to the row drop the cached lookup
+        db.forget_cached_video(7)
+        await db.get_video_by_short_id("abc12345")
+        assert mock_fetch.call_count == 2
+
+    db._video_by_short_id_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_get_user_videos_pages_by_keyset_after_cursor():
+    from src.db import get_user_videos
+
+    mock_client = MagicMock()
+    query = mock_client.table.return_value.select.return_value
+    query.eq.return_value = query
+    query.order.return_value = query
+    query.or_.return_value = query
+    query.limit.return_value.execute = AsyncMock(return_value=MagicMock(data=[{"id": 3}]))
+
+    with patch("src.db.get_database", new_callable=AsyncMock, return_value=mock_client):
+        videos = await get_user_videos(42, limit=10, after=("2024-01-01T00:00:00+00:00", 7))
+
+    assert videos == [{"id": 3}]
+    query.or_.assert_called_once_with(
+        'created_at.lt."2024-01-01T00:00:00+00:00",'
+        'and(created_at.eq."2024-01-01T00:00:00+00:00",id.lt.7)'
+    )
+    query.limit.assert_called_once_with(10)
+    query.range.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_user_videos_next_keyset_follows_raw_rows():
+    from src.db import get_user_videos
+
+    mock_client = MagicMock()
+    query = mock_client.table.return_value.select.return_value
+    query.eq.return_value = query
+    query.order.return_value = query
+    query.or_.return_value = query
+    parts = [
+        {"id": 9, "created_at": "2024-01-02T00:00:00+00:00", "metadata": {"part_index": 2}},
+        {"id": 8, "created_at": "2024-01-01T00:00:00+00:00", "metadata": {"part_index": 3}},
+    ]
+    query.limit.return_value.execute = AsyncMock(return_value=MagicMock(data=parts))
+
+    with patch("src.db.get_database", new_callable=AsyncMock, return_value=mock_client):
+        # A full page of part rows still hands out a cursor past them
+        videos, next_keyset = await get_user_videos(
+            42, limit=2, after=("2024-01-03T00:00:00+00:00", 10), with_next_keyset=True
+        )
+        assert videos == []
+        assert next_keyset == ("2024-01-01T00:00:00+00:00", 8)
+
+        # A short page is the last one
+        videos, next_keyset = await get_user_videos(
+            42, limit=5, after=("2024-01-03T00:00:00+00:00", 10), with_next_keyset=True
+        )
+        assert next_keyset is None
+
+
+@pytest.mark.asyncio
+async def test_fetch_video_by_short_id_embeds_video_row():
+    from src.db import _fetch_video_by_short_id
+
+    mock_client = MagicMock()
+    query = mock_client.table.return_value.select.return_value
+    query.eq.return_value.limit.return_value.execute = AsyncMock(return_value=MagicMock(data=[{
+        "file_id": "file_123",
+        "views": 9,
+        "created_at": "2024-01-01T00:00:00+00:00",
+        "videos": {"id": 7, "file_id": "file_123", "title": "Embedded", "views": 1},
+    }]))
+
+    with patch("src.db.get_database", new_callable=AsyncMock, return_value=mock_client):
+        video = await _fetch_video_by_short_id("abc12345")
+
+    # One shared_links query; the video row comes back embedded
+    mock_client.table.assert_called_once_with("shared_links")
+    assert video["title"] == "Embedded"
+    assert video["views"] == 9
+    assert video["short_id"] == "abc12345"
+
+
+@pytest.mark.asyncio
+async def test_queued_views_flush_as_one_update_per_short_id():
+    import src.db as db
+
+    mock_client = MagicMock()
+    links = mock_client.table.return_value
+    links.select.return_value.eq.return_value.execute = AsyncMock(
+        return_value=MagicMock(data=[{"views": 10, "video_id": None}])
+    )
+    links.update.return_value.eq.return_value.execute = AsyncMock()
+    links.insert.return_value.execute = AsyncMock()
+
+    for _ in range(3):
+        db.queue_view("abc12345", "1.2.3.4", "ua")
+
+    with patch("src.db.get_database", new_callable=AsyncMock, return_value=mock_client):
+        await db.flush_pending_views()
+        # Nothing queued since: no further writes
+        await db.flush_pending_views()
+
+    links.update.assert_called_once_with({"views": 13})
+    links.insert.assert_called_once()
+    assert len(links.insert.call_args[0][0]) == 3
@@ -0,0 +1,151 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+
+import src.link_shortener as link_shortener
+
+
+@pytest.fixture(autouse=True)
+def clear_short_id_cache():
+    link_shortener._short_id_cache.clear()
+    yield
+    link_shortener._short_id_cache.clear()
+
+
+def _mock_client(existing_rows):
+    mock_client = MagicMock()
+    mock_table = MagicMock()
+    mock_client.table.return_value = mock_table
+
+    mock_in = MagicMock()
+    mock_table.select.return_value.in_.return_value = mock_in
+    mock_in.execute = AsyncMock(return_value=MagicMock(data=existing_rows))
+
+    mock_insert = MagicMock()
+    mock_table.insert.return_value = mock_insert
+    mock_insert.execute = AsyncMock(return_value=MagicMock(data=[]))
+
+    return mock_client, mock_table
+
+
+@pytest.mark.asyncio
+async def test_bulk_get_or_create_short_links_single_round_trip():
+    from src.link_shortener import bulk_get_or_create_short_links
+
+    mock_client, mock_table = _mock_client([{"file_id": "f1", "short_id": "abc12345"}])
+    videos = [{"id": 1, "file_id": "f1"}, {"id": 2, "file_id": "f2"}, {"id": 3, "file_id": None}]
+
+    result = await bulk_get_or_create_short_links(mock_client, videos, 42)
+
+    mock_table.select.return_value.in_.assert_called_once_with("file_id", ["f1", "f2"])
+    mock_table.insert.assert_called_once()
+    inserted = mock_table.insert.call_args[0][0]
+    assert [row["file_id"] for row in inserted] == ["f2"]
+    assert inserted[0]["video_id"] == 2
+    assert inserted[0]["user_id"] == 42
+
+    assert result["f1"] == "abc12345"
+    assert result["f2"] == inserted[0]["short_id"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_get_or_create_short_links_no_insert_when_all_exist():
+    from src.link_shortener import bulk_get_or_create_short_links
+
+    mock_client, mock_table = _mock_client([{"file_id": "f1", "short_id": "abc12345"}])
+
+    result = await bulk_get_or_create_short_links(mock_client, [{"id": 1, "file_id": "f1"}], 42)
+
+    assert result == {"f1": "abc12345"}
+    mock_table.insert.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_bulk_get_or_create_short_links_falls_back_to_file_id():
+    from src.link_shortener import bulk_get_or_create_short_links
+
+    mock_client = MagicMock()
+    mock_client.table.side_effect = Exception("connection lost")
+
+    result = await bulk_get_or_create_short_links(mock_client, [{"id": 1, "file_id": "f1"}], 42)
+
+    assert result == {"f1": "f1"}
+
+
+@pytest.mark.asyncio
+async def test_short_ids_are_served_from_memory_after_first_lookup():
+    from src.link_shortener import get_or_create_short_link, bulk_get_or_create_short_links, forget_short_ids
+
+    mock_client = MagicMock()
+    mock_eq = MagicMock()
+    mock_client.table.return_value.select.return_value.eq.return_value = mock_eq
+    mock_eq.execute = AsyncMock(return_value=MagicMock(data=[{"short_id": "abc12345"}]))
+
+    assert await get_or_create_short_link(mock_client, "f1", 1, 42) == "abc12345"
+    assert await get_or_create_short_link(mock_client, "f1", 1, 42) == "abc12345"
+    assert mock_eq.execute.await_count == 1
+
+    # Bulk lookups reuse the cached mapping without touching the database
+    mock_client.table.reset_mock()
+    assert await bulk_get_or_create_short_links(mock_client, [{"id": 1, "file_id": "f1"}], 42) == {"f1": "abc12345"}
+    mock_client.table.assert_not_called()
+
+    forget_short_ids(["abc12345"])
+    assert "f1" not in link_shortener._short_id_cache
+
+
+
+@pytest.mark.asyncio
+async def test_bulk_insert_rerolls_only_colliding_short_ids():
+    from postgrest.exceptions import APIError
+    from src.link_shortener import bulk_get_or_create_short_links
+
+    mock_client, mock_table = _mock_client([])
+    inserted_batches = []
+
+    async def insert_execute():
+        inserted_batches.append([dict(row) for row in mock_table.insert.call_args[0][0]])
+        if len(inserted_batches) == 1:
+            raise APIError({"code": "23505", "message": "duplicate key value violates unique constraint"})
+        return MagicMock(data=[])
+
+    mock_table.insert.return_value.execute = insert_execute
+
+    # First in_() call is the file_id lookup, the second is the short_id probe
+    lookup_query = mock_table.select.return_value.in_.return_value
+
+    def in_dispatch(column, values):
+        if column == "file_id":
+            return lookup_query
+        probe = MagicMock()
+        probe.execute = AsyncMock(return_value=MagicMock(data=[{"short_id": values[0]}]))
+        return probe
+
+    mock_table.select.return_value.in_.side_effect = in_dispatch
+
+    videos = [{"id": 1, "file_id": "f1"}, {"id": 2, "file_id": "f2"}]
+    result = await bulk_get_or_create_short_links(mock_client, videos, 42)
+
+    assert len(inserted_batches) == 2
+    original = {row["file_id"]: row["short_id"] for row in inserted_batches[0]}
+    retried = {row["file_id"]: row["short_id"] for row in inserted_batches[1]}
+    assert retried["f1"] != original["f1"]
+    assert retried["f2"] == original["f2"]
+    assert result == retried
+
+
+@pytest.mark.asyncio
+async def test_attach_video_to_short_link_links_both_rows():
+    from src.link_shortener import attach_video_to_short_link
+
+    mock_client = MagicMock()
+    tables = {"shared_links": MagicMock(), "videos": MagicMock()}
+    mock_client.table.side_effect = tables.__getitem__
+    for table in tables.values():
+        table.update.return_value.eq.return_value.execute = AsyncMock(return_value=MagicMock(data=[]))
+
+    await attach_video_to_short_link(mock_client, "abc12345", 7)
+
+    tables["shared_links"].update.assert_called_once_with({"video_id": 7})
+    tables["shared_links"].update.return_value.eq.assert_called_once_with("short_id", "abc12345")
+    tables["videos"].update.assert_called_once_with({"short_id": "abc12345"})
+    tables["videos"].update.return_value.eq.assert_called_once_with("id", 7)
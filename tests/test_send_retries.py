@@ -0,0 +1,30 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from telegram.error import BadRequest, RetryAfter, TimedOut
+
+from src.server import send_with_retries
+
+
+@pytest.mark.asyncio
+async def test_send_with_retries_does_not_retry_bad_request():
+    send = AsyncMock(side_effect=BadRequest("file is too big"))
+
+    with patch("src.server.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        with pytest.raises(BadRequest):
+            await send_with_retries(send, "send_document")
+
+    assert send.call_count == 1
+    mock_sleep.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_send_with_retries_retries_transient_errors():
+    send = AsyncMock(side_effect=[TimedOut(), RetryAfter(7), "ok"])
+
+    with patch("src.server.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        result = await send_with_retries(send, "send_document")
+
+    assert result == "ok"
+    assert send.call_count == 3
+    # Flood control honours the server-provided delay
+    assert mock_sleep.call_args_list[1].args[0] == 7
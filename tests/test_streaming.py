@@ -1,3 +1,4 @@
+import orjson
 import pytest
 from unittest.mock import MagicMock, AsyncMock, patch
 from fastapi.testclient import TestClient
@@ -47,6 +48,14 @@ def test_parse_range_header_boundary():
     # Last byte
     result = parse_range_header("bytes=999-999", 1000)
     assert result == (999, 999)
+    
+    # Multiple ranges: only the first one is served
+    result = parse_range_header("bytes=0-99,200-299", 1000)
+    assert result == (0, 99)
+    
+    # Suffix ranges are not supported
+    result = parse_range_header("bytes=-500", 1000)
+    assert result is None
 
 
 def test_generate_etag():
@@ -75,8 +84,8 @@ async def test_stream_video_with_range():
     with patch('src.server.get_file_info_cached', new_callable=AsyncMock) as mock_get_file:
         mock_get_file.return_value = ("https://example.com/file.mp4", 1000000)
         
-        # Mock httpx client streaming
-        with patch('httpx.AsyncClient') as mock_client:
+        # Mock the shared httpx client
+        with patch('src.server.get_http_client') as mock_client:
             mock_stream_response = AsyncMock()
             mock_stream_response.raise_for_status = MagicMock()
             
@@ -91,8 +100,6 @@ async def test_stream_video_with_range():
             
             mock_client_instance = AsyncMock()
             mock_client_instance.stream = MagicMock(return_value=mock_context)
-            mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
-            mock_client_instance.__aexit__ = AsyncMock()
             
             mock_client.return_value = mock_client_instance
             
@@ -118,7 +125,7 @@ async def test_stream_video_full_file():
     with patch('src.server.get_file_info_cached', new_callable=AsyncMock) as mock_get_file:
         mock_get_file.return_value = ("https://example.com/file.mp4", 1000000)
         
-        with patch('httpx.AsyncClient') as mock_client:
+        with patch('src.server.get_http_client') as mock_client:
             mock_stream_response = AsyncMock()
             mock_stream_response.raise_for_status = MagicMock()
             
@@ -133,8 +140,6 @@ async def test_stream_video_full_file():
             
             mock_client_instance = AsyncMock()
             mock_client_instance.stream = MagicMock(return_value=mock_context)
-            mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
-            mock_client_instance.__aexit__ = AsyncMock()
             
             mock_client.return_value = mock_client_instance
             
@@ -177,24 +182,22 @@ async def test_file_info_cache():
     # Clear cache
     file_info_cache.clear()
     
-    with patch('httpx.AsyncClient') as mock_client:
+    with patch('src.server.get_http_client') as mock_client:
         mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_response.content = orjson.dumps({
             "ok": True,
             "result": {
                 "file_path": "videos/test.mp4",
                 "file_size": 1000000
             }
-        }
+        })
         
         mock_client_instance = AsyncMock()
         mock_client_instance.get = AsyncMock(return_value=mock_response)
-        mock_client_instance.__aenter__ = AsyncMock(return_value=mock_client_instance)
-        mock_client_instance.__aexit__ = AsyncMock()
         
         mock_client.return_value = mock_client_instance
         
-        with patch.dict('os.environ', {'TELEGRAM_BOT_TOKEN': 'test_token'}):
+        with patch('src.server.TELEGRAM_BOT_TOKEN', 'test_token'):
             # First call - should fetch from API
             url1, size1 = await get_file_info_cached("test_file_id")
             assert url1.endswith("videos/test.mp4")
@@ -227,3 +230,101 @@ def test_cache_expiration():
     # Verify it's considered expired (actual check happens in get_file_info_cached)
     cached = file_info_cache["expired_file"]
     assert time.time() - cached["timestamp"] > CACHE_TTL
+
+
+@pytest.mark.asyncio
+async def test_file_info_cache_evicts_least_recently_used():
+    """Cache hits refresh recency; overflow evicts the oldest untouched entry"""
+    from src.server import get_file_info_cached, file_info_cache
+
+    file_info_cache.clear()
+
+    with patch('src.server.get_http_client') as mock_client, \
+         patch('src.server.MAX_CACHE_SIZE', 2):
+        mock_response = MagicMock()
+        mock_response.content = orjson.dumps({
+            "ok": True,
+            "result": {"file_path": "videos/test.mp4", "file_size": 1000}
+        })
+        mock_client.return_value.get = AsyncMock(return_value=mock_response)
+
+        with patch('src.server.TELEGRAM_BOT_TOKEN', 'test_token'):
+            await get_file_info_cached("a")
+            await get_file_info_cached("b")
+            await get_file_info_cached("a")  # hit, "b" is now least recent
+            await get_file_info_cached("c")
+
+    assert list(file_info_cache) == ["a", "c"]
+
+
+@pytest.mark.asyncio
+async def test_file_info_cache_drops_expired_entry_when_refetch_fails():
+    """An expired URL is not kept around when Telegram no longer knows the file"""
+    from fastapi import HTTPException
+    from src.server import get_file_info_cached, file_info_cache, CACHE_TTL
+    import time
+
+    file_info_cache.clear()
+    file_info_cache["gone"] = {
+        "url": "https://example.com/old.mp4",
+        "size": 1000,
+        "timestamp": time.time() - CACHE_TTL - 1
+    }
+
+    with patch('src.server.get_http_client') as mock_client:
+        mock_response = MagicMock()
+        mock_response.content = orjson.dumps({"ok": False, "description": "Bad Request: invalid file_id"})
+        mock_client.return_value.get = AsyncMock(return_value=mock_response)
+
+        with patch('src.server.TELEGRAM_BOT_TOKEN', 'test_token'):
+            with pytest.raises(HTTPException):
+                await get_file_info_cached("gone")
+
+    assert "gone" not in file_info_cache
+
+
+def test_stream_encoded_video_revalidates_with_etag(tmp_path):
+    """Encoded MP4s carry an ETag and answer a matching If-None-Match with 304"""
+    encoded = tmp_path / "abc_mobile.mp4"
+    encoded.write_bytes(b"x" * 1000)
+    client = TestClient(app)
+
+    with patch('src.server.get_video_by_short_id', new_callable=AsyncMock) as mock_get_video:
+        mock_get_video.return_value = {"metadata": {"encoded_path": str(encoded)}}
+
+        response = client.get("/stream/encoded/abc")
+        assert response.status_code == 200
+        assert response.headers["content-length"] == "1000"
+
+        response = client.get(
+            "/stream/encoded/abc",
+            headers={"If-None-Match": response.headers["etag"]}
+        )
+        assert response.status_code == 304
+
+
+def test_stream_video_upstream_error_is_not_a_200():
+    """An upstream failure surfaces as 502 before any body is sent"""
+    import httpx
+
+    client = TestClient(app)
+    upstream_request = httpx.Request("GET", "https://example.com/file.mp4")
+    upstream_response = httpx.Response(500, request=upstream_request)
+
+    with patch('src.server.get_file_info_cached', new_callable=AsyncMock) as mock_get_file:
+        mock_get_file.return_value = ("https://example.com/file.mp4", 1000000)
+
+        with patch('src.server.get_http_client') as mock_client:
+            mock_stream_response = MagicMock()
+            mock_stream_response.raise_for_status.side_effect = httpx.HTTPStatusError(
+                "server error", request=upstream_request, response=upstream_response
+            )
+            mock_context = AsyncMock()
+            mock_context.__aenter__ = AsyncMock(return_value=mock_stream_response)
+            mock_context.__aexit__ = AsyncMock(return_value=False)
+            mock_client.return_value.stream = MagicMock(return_value=mock_context)
+
+            response = client.get("/stream/test_file_id")
+
+            assert response.status_code == 502
+            mock_context.__aexit__.assert_awaited_once()
@@ -0,0 +1,38 @@
+from unittest.mock import patch
+
+from src.ttl_cache import TTLCache
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=10, ttl=30)
+
+    with patch("src.ttl_cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+
+    with patch("src.ttl_cache.time.monotonic", return_value=131.0):
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_invalidate_by_predicate():
+    cache = TTLCache()
+    cache.set((1, "x"), "one")
+    cache.set((2, "x"), "two")
+
+    cache.invalidate(lambda key: key[0] == 1)
+
+    assert (1, "x") not in cache
+    assert cache.get((2, "x")) == "two"
@@ -0,0 +1,44 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.server import pick_reusable_upload, save_video_with_short_link
+
+
+@pytest.mark.asyncio
+async def test_failed_video_insert_deletes_the_new_short_link():
+    sb = MagicMock()
+    sb.table.return_value.insert.return_value.execute = AsyncMock(side_effect=RuntimeError("db down"))
+
+    with patch("src.server.create_short_link", new_callable=AsyncMock, return_value="abc12345"), \
+            patch("src.server.delete_short_link", new_callable=AsyncMock) as mock_delete:
+        with pytest.raises(RuntimeError, match="db down"):
+            await save_video_with_short_link(sb, {"file_id": "f1"}, 42)
+
+    mock_delete.assert_awaited_once_with(sb, "abc12345")
+
+
+@pytest.mark.asyncio
+async def test_saved_video_returns_row_id_and_short_link():
+    sb = MagicMock()
+    sb.table.return_value.insert.return_value.execute = AsyncMock(return_value=MagicMock(data=[{"id": 7}]))
+
+    with patch("src.server.create_short_link", new_callable=AsyncMock, return_value="abc12345"), \
+            patch("src.server.delete_short_link", new_callable=AsyncMock) as mock_delete:
+        assert await save_video_with_short_link(sb, {"file_id": "f1"}, 42) == (7, "abc12345")
+
+    mock_delete.assert_not_called()
+
+
+def test_reusable_upload_must_match_quality_and_prefers_own_row():
+    videos = [
+        {"id": 1, "file_id": "f1", "user_id": 7, "metadata": {"quality": "720"}},
+        {"id": 2, "file_id": "f2", "user_id": 7},
+        {"id": 3, "file_id": "f3", "user_id": 42, "metadata": {"quality": "best"}},
+        {"id": 4, "file_id": "f4", "user_id": 42, "metadata": {"quality": "best", "is_audio": True}},
+    ]
+
+    # Rows without a recorded quality count as "best"; the caller's row wins
+    assert pick_reusable_upload(videos, 42, "best")["id"] == 3
+    assert pick_reusable_upload(videos, 9, "best")["id"] == 2
+    assert pick_reusable_upload(videos, 42, "720")["id"] == 1
+    assert pick_reusable_upload(videos, 42, "480") is None
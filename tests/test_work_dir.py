@@ -0,0 +1,25 @@
+import tempfile
+
+from src.work_dir import get_work_dir
+
+
+def test_work_dir_created_from_env(tmp_path, monkeypatch):
+    target = tmp_path / "scratch"
+    monkeypatch.setenv("DL_WORKDIR", str(target))
+    get_work_dir.cache_clear()
+    try:
+        assert get_work_dir() == str(target)
+        assert target.is_dir()
+    finally:
+        get_work_dir.cache_clear()
+
+
+def test_unwritable_work_dir_falls_back_to_system_temp(tmp_path, monkeypatch):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    monkeypatch.setenv("DL_WORKDIR", str(blocker / "scratch"))
+    get_work_dir.cache_clear()
+    try:
+        assert get_work_dir() == tempfile.gettempdir()
+    finally:
+        get_work_dir.cache_clear()